@@ -57,73 +57,66 @@ except ImportError as e:
     st.error(f"Could not import run_rare_disease_match: {e}")
     run_rare_disease_match_with_data = None
 
-@st.cache_data
-def load_backend_databases():
-    """Load and validate all backend databases with proper error handling"""
-    databases = {
-        'clinical_trials': None,
-        'gene_disease': None,
-        'orphan_drugs': None,
-        'rare_disease_matches': None,
-        'status': {},
-        'file_dates': {}
-    }
-    
-    # Define file paths
-    base_path = Path(__file__).parent
-    files_to_load = {
-        'clinical_trials': base_path / 'matched_clinical_trials_20240716_cleaned.csv',
-        'gene_disease': base_path / 'gene_disease.txt',
-        'orphan_drugs': base_path / 'orphan_drugs.txt',
-        'rare_disease_matches': base_path / 'rare_disease_matches_20240716_cleaned.csv'
-    }
-    
-    # Load each database with multi-encoding support
-    for db_name, file_path in files_to_load.items():
-        try:
-            if file_path.exists():
-                # Get file modification date
-                import datetime
-                mod_time = file_path.stat().st_mtime
-                file_date = datetime.datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d %H:%M')
-                databases['file_dates'][db_name] = file_date
-                
-                # Try multiple encodings
-                encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-                df = None
-                
-                for encoding in encodings:
-                    try:
-                        if file_path.suffix == '.csv':
-                            df = pd.read_csv(file_path, encoding=encoding)
-                        elif file_path.suffix == '.txt':
-                            df = pd.read_csv(file_path, sep='\t', encoding=encoding)
-                        
-                        # If we get here, the encoding worked
-                        databases[db_name] = df
-                        databases['status'][db_name] = f"✅ Loaded {len(df)} records ({encoding})"
-                        break
-                        
-                    except UnicodeDecodeError:
-                        continue
-                
-                # If no encoding worked
-                if df is None:
-                    databases['status'][db_name] = f"❌ Could not decode file with any encoding"
-                    databases[db_name] = None
-            else:
-                databases['status'][db_name] = f"❌ File not found: {file_path}"
-                databases[db_name] = None
-                databases['file_dates'][db_name] = "N/A"
-                
-        except Exception as e:
-            databases['status'][db_name] = f"❌ Unexpected error: {str(e)}"
-            databases[db_name] = None
-            databases['file_dates'][db_name] = "Error"
+from utils.database_manager import get_backend_repository
+
+# Loading state labels shown in the status panel
+DATABASE_STATE_LABELS = {
+    'pending': '💤 Not loaded yet',
+    'loading': '⏳ Loading...',
+    'ready': '✅ Ready',
+    'error': '❌ Error'
+}
+
+def display_single_database_status(repository, db_name, info):
+    """Display the status expander for one backend database"""
+    state = repository.get_state(db_name)
     
-    return databases
+    with st.expander(f"{info['icon']} {info['name']} • {DATABASE_STATE_LABELS[state]}", expanded=False):
+        # Status
+        if state == 'ready':
+            st.success(repository.get_status(db_name))
+        elif state == 'error':
+            st.error(repository.get_status(db_name))
+        else:
+            st.info(f"{DATABASE_STATE_LABELS[state]} - loads on first use or in the background")
+        
+        # File date
+        file_date = repository.get_file_date(db_name)
+        st.info(f"📅 **File Date:** {file_date}")
+        
+        # Content version - the SHA-256 of the source bytes, identical across renames
+        version_info = repository.get_version_info(db_name)
+        if version_info is not None:
+            st.info(f"📊 **Version:** {version_info['version']} • first seen {version_info['first_seen'].replace('T', ' ')}")
+            st.caption(f"SHA-256: {version_info['sha256']}")
+        
+        loaded_at = repository.get_loaded_at(db_name)
+        if loaded_at is not None:
+            st.caption(f"🔄 Current version loaded at {loaded_at:%Y-%m-%d %H:%M:%S} • reloads automatically when the file changes")
+        
+        # Description
+        st.write(f"📝 **Description:** {info['description']}")
+        
+        # Show dimensions if available - from the manifest when the table is not loaded yet
+        if repository.is_loaded(db_name):
+            df = repository.get_table(db_name)
+            columns = list(df.columns)
+            st.write(f"📏 **Dimensions:** {df.shape[0]:,} rows × {df.shape[1]} columns")
+        else:
+            table_info = repository.get_table_info(db_name)
+            if table_info is None:
+                return
+            columns = [col['name'] for col in table_info['columns']]
+            st.write(f"📏 **Dimensions:** {table_info['row_count']:,} rows × {len(columns)} columns")
+        st.write(f"🏷️ **Columns:** {', '.join(columns[:5])}{'...' if len(columns) > 5 else ''}")
+        
+        # Per-column memory breakdown for loaded tables
+        memory_report = repository.get_memory_report(db_name)
+        if memory_report is not None:
+            st.write(f"💾 **Memory:** {memory_report['Memory (KB)'].sum() / 1024:,.1f} MB")
+            st.dataframe(memory_report, use_container_width=True, hide_index=True)
 
-def display_database_status(databases):
+def display_database_status(repository):
     """Display database loading status in the UI with file dates"""
     st.subheader("🗄️ Backend Database Status")
     
@@ -159,64 +152,27 @@ def display_database_status(databases):
     # First column - first 2 databases
     with col1:
         for db_name, info in databases_list[:2]:
-            with st.expander(f"{info['icon']} {info['name']}", expanded=False):
-                # Status
-                status = databases['status'].get(db_name, 'Not loaded')
-                if "✅" in status:
-                    st.success(status)
-                else:
-                    st.error(status)
-                
-                # File date
-                file_date = databases['file_dates'].get(db_name, 'Unknown')
-                st.info(f"📅 **File Date:** {file_date}")
-                
-                # Description
-                st.write(f"📝 **Description:** {info['description']}")
-                
-                # Show sample data if available
-                if databases[db_name] is not None:
-                    df = databases[db_name]
-                    st.write(f"📏 **Dimensions:** {df.shape[0]:,} rows × {df.shape[1]} columns")
-                    st.write(f"🏷️ **Columns:** {', '.join(df.columns[:5])}{'...' if len(df.columns) > 5 else ''}")
+            display_single_database_status(repository, db_name, info)
     
     # Second column - remaining databases
     with col2:
         for db_name, info in databases_list[2:]:
-            with st.expander(f"{info['icon']} {info['name']}", expanded=False):
-                # Status
-                status = databases['status'].get(db_name, 'Not loaded')
-                if "✅" in status:
-                    st.success(status)
-                else:
-                    st.error(status)
-                
-                # File date
-                file_date = databases['file_dates'].get(db_name, 'Unknown')
-                st.info(f"📅 **File Date:** {file_date}")
-                
-                # Description
-                st.write(f"📝 **Description:** {info['description']}")
-                
-                # Show sample data if available
-                if databases[db_name] is not None:
-                    df = databases[db_name]
-                    st.write(f"📏 **Dimensions:** {df.shape[0]:,} rows × {df.shape[1]} columns")
-                    st.write(f"🏷️ **Columns:** {', '.join(df.columns[:5])}{'...' if len(df.columns) > 5 else ''}")
+            display_single_database_status(repository, db_name, info)
     
-    # Overall summary
-    total_records = 0
-    loaded_databases = 0
+    # Overall summary - never forces a load, so the first paint stays fast
+    states = [repository.get_state(db_name) for db_name in database_info]
+    total_records = sum(repository.row_count(db_name) for db_name in database_info if repository.is_loaded(db_name))
+    ready_databases = states.count('ready')
     
-    for db_name in database_info.keys():
-        if databases[db_name] is not None:
-            total_records += len(databases[db_name])
-            loaded_databases += 1
+    if 'error' in states:
+        st.error(f"❌ {states.count('error')}/{len(database_info)} databases failed to load")
+    if ready_databases == len(database_info):
+        st.success(f"📈 **Summary:** {ready_databases}/{len(database_info)} databases loaded successfully • {total_records:,} total records available")
+    elif 'error' not in states:
+        st.info(f"⏳ **Summary:** {ready_databases}/{len(database_info)} databases ready • remaining databases load on first use")
     
-    if loaded_databases > 0:
-        st.success(f"📈 **Summary:** {loaded_databases}/{len(database_info)} databases loaded successfully • {total_records:,} total records available")
-    else:
-        st.error("❌ No databases loaded successfully")
+    if st.button("🔄 Refresh status", key="refresh_database_status"):
+        st.rerun()
 
 def safe_run_trial_matcher(patient_data):
     """Safely run trial matcher with patient data"""
@@ -258,11 +214,8 @@ def main():
         if apply_enhanced_styles is not None:
             apply_enhanced_styles()
         
-        # Load databases
-        databases = load_backend_databases()
-        
-        # Store in session state for access by modules
-        st.session_state['databases'] = databases
+        # Shared repository used by every module - tables load lazily on first use
+        repository = get_backend_repository()
         
         # Dynamic animated header
         if create_header is not None:
@@ -272,7 +225,7 @@ def main():
             st.subheader("Trials and Drugs Explorer for Rare Diseases")
         
         # Database status section
-        display_database_status(databases)
+        display_database_status(repository)
         
         if create_custom_divider is not None:
             create_custom_divider()
@@ -362,6 +315,11 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
+        # The page has been painted - warm the remaining tables in the background
+        # and start watching the source files for hot reloads
+        repository.prefetch()
+        repository.start_watcher()
+        
     except Exception as e:
         st.error(f"Application error: {str(e)}")
         st.exception(e)
@@ -3,11 +3,10 @@ import pandas as pd
 from datetime import date
 from ui.components import (
     display_results_with_download,
-    create_loading_context, update_progress
-)
-from utils.enhanced_data_utils import (
-    load_backend_reactor_database, filter_valid_patients, validate_file_structure
+    create_loading_context, ProgressReporter
 )
+from utils.enhanced_data_utils import filter_valid_patients, validate_file_structure
+from utils.database_manager import get_backend_repository
 
 def compare_with_reactor_database(current_df, reactor_df):
     """Compare current patient data with REACTOR database to find new matches"""
@@ -15,14 +14,13 @@ def compare_with_reactor_database(current_df, reactor_df):
     current_df = filter_valid_patients(current_df)
     reactor_df = filter_valid_patients(reactor_df)
     
-    progress_total = len(current_df)
-    progress_bar = st.progress(0, text="Comparing with REACTOR database...")
+    progress = ProgressReporter(len(current_df), "Comparing with REACTOR database...")
 
     new_matches = pd.DataFrame()
     for i, row in current_df.iterrows():
         if row['PatientID'] not in reactor_df['PatientID'].values:
             new_matches = pd.concat([new_matches, pd.DataFrame([row])], ignore_index=True)
-        update_progress(progress_bar, i + 1, progress_total, "Analyzing")
+        progress.advance()
 
     return new_matches, current_df, reactor_df
 
@@ -42,18 +40,20 @@ def run_file_comparison_with_data(patient_data):
     # Backend Database Status
     st.markdown("**🗄️ REACTOR Database Status**")
     
+    repository = get_backend_repository()
     col1, col2 = st.columns(2)
     
     with col1:
         try:
-            reactor_count = load_backend_reactor_database(check_only=True)
+            reactor_count = repository.check_available('rare_disease_matches')
             st.success(f"✅ REACTOR DB: {reactor_count:,} historical records")
         except Exception as e:
             st.error(f"❌ REACTOR DB: {str(e)}")
     
     with col2:
-        st.info("🔄 Last Updated: 2025-06-20")
-        st.info("📊 Database Version: v3.2")
+        reactor_version, reactor_updated = repository.get_version_summary('rare_disease_matches')
+        st.info(f"🔄 Last Updated: {reactor_updated}")
+        st.info(f"📊 Database Version: {reactor_version}")
 
     st.markdown("---")
 
@@ -65,7 +65,7 @@ def run_file_comparison_with_data(patient_data):
                     return
                 
                 # Load backend REACTOR database
-                reactor_df = load_backend_reactor_database()
+                reactor_df = repository.get_reactor()
                 if reactor_df.empty:
                     st.error("❌ Failed to load REACTOR database.")
                     return
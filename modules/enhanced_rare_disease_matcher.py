@@ -1,25 +1,34 @@
 import streamlit as st
 import pandas as pd
 import re
-import time
 from datetime import date
 from ui.components import (
     display_results_with_download,
-    create_loading_context, update_progress, simulate_progress_with_delay
-)
-from utils.enhanced_data_utils import (
-    clean_column, load_backend_gene_disease_database,
-    load_backend_orphan_drugs_database, validate_file_structure
+    create_loading_context, ProgressReporter
 )
+from utils.enhanced_data_utils import clean_column, validate_file_structure
+from utils.database_manager import get_backend_repository
+
+# The only columns the matching loop reads from each backend table
+GENE_DISEASE_MATCH_COLUMNS = ['Name', 'Symbol']
+ORPHAN_MATCH_COLUMNS = ['OrphanDesignation']
 
-def find_rare_disease_matches(patients_df, gene_disease_df, orphan_df):
-    """Find matches between patients and FDA orphan designated drugs"""
+def find_rare_disease_matches(patients_df, gene_disease_df, orphan_df, fetch_orphan_rows=None, progress=None):
+    """Find matches between patients and FDA orphan designated drugs
+    
+    ``orphan_df`` only needs the OrphanDesignation column when
+    ``fetch_orphan_rows`` is given to materialize full records for matches.
+    ``progress`` is advanced once per patient-disease pair searched.
+    """
     # Clean phenotype data
     patients_df['Phenotype'] = patients_df['Phenotype'].apply(clean_column)
     
     # Merge patients with gene-disease mapping
     matched_genes = pd.merge(patients_df, gene_disease_df, left_on='Gene', right_on='Symbol')
 
+    if progress is not None:
+        progress.set_total(len(matched_genes), "Matching drugs")
+    
     all_matches = []
     for _, row in matched_genes.iterrows():
         disease_name = re.escape(row['Name'])
@@ -31,29 +40,35 @@ def find_rare_disease_matches(patients_df, gene_disease_df, orphan_df):
         )]
         
         if not orphan_matches.empty:
+            if fetch_orphan_rows is not None:
+                orphan_matches = fetch_orphan_rows(orphan_matches.index)
             repeated_row = pd.DataFrame([row] * len(orphan_matches)).reset_index(drop=True)
             merged = pd.concat([repeated_row, orphan_matches.reset_index(drop=True)], axis=1)
             all_matches.append(merged)
+        
+        if progress is not None:
+            progress.advance()
     
     return pd.concat(all_matches, ignore_index=True).drop_duplicates() if all_matches else pd.DataFrame()
 
 def process_rare_disease_matching(patients_df):
     """Process rare disease matching with backend database integration"""
-    # Load backend database files
-    gene_disease_df = load_backend_gene_disease_database()
-    orphan_df = load_backend_orphan_drugs_database()
+    # Load only the matching columns; full orphan drug records are fetched for matches alone
+    repository = get_backend_repository()
+    gene_disease_df = repository.get_columns('gene_disease', GENE_DISEASE_MATCH_COLUMNS)
+    orphan_snapshot = repository.snapshot('orphan_drugs')
     
-    if gene_disease_df.empty or orphan_df.empty:
+    if gene_disease_df.empty or orphan_snapshot.df is None or orphan_snapshot.df.empty:
         return pd.DataFrame()
+    orphan_df = orphan_snapshot.project(ORPHAN_MATCH_COLUMNS)
     
-    # Progress tracking
-    progress_total = len(patients_df)
-    progress_bar = st.progress(0, text="Processing rare disease matches...")
-    
-    matches = find_rare_disease_matches(patients_df, gene_disease_df, orphan_df)
+    # Progress tracking over the real matching work
+    progress = ProgressReporter(message="Processing rare disease matches...")
     
-    # Simulate progress for better UX
-    simulate_progress_with_delay(progress_bar, progress_total, "Matching drugs")
+    matches = find_rare_disease_matches(
+        patients_df, gene_disease_df, orphan_df, fetch_orphan_rows=orphan_snapshot.fetch_rows, progress=progress
+    )
+    progress.finish()
     
     return matches
 
@@ -73,28 +88,31 @@ def run_rare_disease_match_with_data(patient_data):
     # Backend Database status check
     st.markdown("**📊 Backend Database Status**")
     
+    repository = get_backend_repository()
     col1, col2 = st.columns(2)
     
     with col1:
         try:
-            gene_disease_count = load_backend_gene_disease_database(check_only=True)
+            gene_disease_count = repository.check_available('gene_disease')
             st.success(f"✅ Gene-Disease DB: {gene_disease_count:,} entries")
         except Exception as e:
             st.error(f"❌ Gene-Disease DB: {str(e)}")
     
     with col2:
         try:
-            orphan_count = load_backend_orphan_drugs_database(check_only=True)
+            orphan_count = repository.check_available('orphan_drugs')
             st.success(f"✅ Orphan Drugs DB: {orphan_count:,} entries")
         except Exception as e:
             st.error(f"❌ Orphan Drugs DB: {str(e)}")
     
     # Additional database info
+    gene_disease_version, gene_disease_updated = repository.get_version_summary('gene_disease')
+    orphan_version, orphan_updated = repository.get_version_summary('orphan_drugs')
     col3, col4 = st.columns(2)
     with col3:
-        st.info("🔄 Last Updated: 2025-06-20")
+        st.info(f"🔄 Last Updated: Gene-Disease {gene_disease_updated} • Orphan Drugs {orphan_updated}")
     with col4:
-        st.info("📊 Database Version: v4.1")
+        st.info(f"📊 Database Version: Gene-Disease {gene_disease_version} • Orphan Drugs {orphan_version}")
     
     st.markdown("---")
     
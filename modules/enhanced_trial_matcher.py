@@ -1,19 +1,67 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import re
 import time
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import date
 from ui.components import (
-    display_results_with_download, create_loading_context,
-    update_progress, simulate_progress_with_delay
+    display_paged_results_with_download, create_loading_context, LiveResultsTable, ProgressReporter
 )
 from utils.enhanced_data_utils import (
-    load_backend_trial_database, apply_exclusion_filters,
-    create_gene_regex, validate_file_structure
+    apply_exclusion_bitmask, apply_exclusion_filters, compute_exclusion_bitmask, count_exclusions,
+    create_gene_regex, get_exclusion_bits, get_exclusion_patterns, get_exclusion_registry,
+    validate_file_structure
 )
+from utils.cohort_matrix import (
+    build_gene_trial_matrix, build_patient_gene_matrix, get_match_counts, get_match_pairs,
+    is_sparse_available, match_cohort_matrix
+)
+from utils.database_cache import get_cache_dir
+from utils.database_manager import get_backend_repository
+from utils.exclusion_registry import EXCLUSION_CONFIG_FILENAME, ExclusionColumns
+from utils.gene_hit_cache import GeneHitCache
+from utils.match_counts import count_gene_facets
+from utils.phenotype_index import PHENOTYPE_INDEX_FORMAT, is_phenotype_matching_available, load_phenotype_index
+from utils.trial_match_result import TrialMatchResult
+from utils.trial_index import TrialTokenIndex, group_gene_hits, scan_cohort_genes
+from utils.trial_ranking import rank_gene_hits
+from utils.trial_store import is_fts5_available
+
+SEARCH_ENGINES = ["In-memory (pandas)", "SQLite FTS5 index", "One-pass cohort scan", "Sparse cohort matrix (batch)"]
+
+# The only trial columns the matching loop reads
+TRIAL_MATCH_COLUMNS = ['StudyTitle', 'BriefSummary']
+
+# Gene chunks handed to each worker process over a parallel run
+CHUNKS_PER_WORKER = 4
+
+# Ranked results kept per patient unless the user asks for more
+DEFAULT_TOP_K = 25
 
-def create_exclusion_filters():
-    """Create exclusion filter selection interface"""
+MATCH_MODES = ["🧬 Gene", "🩺 Phenotype similarity"]
+DEFAULT_PHENOTYPE_TOP_K = 10
+
+# Session state entry holding the last match results of this session
+TRIAL_RESULTS_KEY = 'trial_match_results'
+
+# Matching inputs for forked worker processes - set by the parent right before
+# the pool starts, so workers inherit the tables and indexes instead of
+# receiving pickled copies
+_POOL_CONTEXT = {}
+_POOL_LOCK = threading.Lock()
+
+def create_exclusion_filters(exclusion_counts=None):
+    """Create exclusion filter selection interface
+    
+    ``exclusion_counts`` maps each category to the number of trials it
+    removes and is shown next to its checkbox when available. The built-in
+    categories are followed by the site's own from the registry file.
+    """
     st.markdown("**🎛️ Exclusion Filters**")
     st.markdown("*Select condition categories to exclude from matching (helps focus on rare diseases):*")
     
@@ -28,19 +76,26 @@ def create_exclusion_filters():
         'Metabolic': '⚖️ Diabetes, obesity, metabolic syndrome',
         'Autoimmune': '🛡️ Arthritis, lupus, inflammatory bowel disease'
     }
+    registry = get_exclusion_registry()
+    exclusion_options.update(registry.descriptions)
+    for error in registry.errors:
+        st.warning(f"⚠️ Skipped custom exclusion category in {EXCLUSION_CONFIG_FILENAME} - {error}")
     
     # Create filter selection in two columns
     col1, col2 = st.columns(2)
     selected_filters = []
+    half = (len(exclusion_options) + 1) // 2
     
     with col1:
-        for i, (key, description) in enumerate(list(exclusion_options.items())[:4]):
-            if st.checkbox(f"{description}", key=f"trial_filter_{key}"):
+        for i, (key, description) in enumerate(list(exclusion_options.items())[:half]):
+            label = description if exclusion_counts is None else f"{description} ({exclusion_counts.get(key, 0):,} trials)"
+            if st.checkbox(label, key=f"trial_filter_{key}"):
                 selected_filters.append(key)
     
     with col2:
-        for i, (key, description) in enumerate(list(exclusion_options.items())[4:]):
-            if st.checkbox(f"{description}", key=f"trial_filter_{key}"):
+        for i, (key, description) in enumerate(list(exclusion_options.items())[half:]):
+            label = description if exclusion_counts is None else f"{description} ({exclusion_counts.get(key, 0):,} trials)"
+            if st.checkbox(label, key=f"trial_filter_{key}"):
                 selected_filters.append(key)
     
     # Show selected filters summary
@@ -51,50 +106,101 @@ def create_exclusion_filters():
     
     return selected_filters
 
+def get_trial_token_index(trial_snapshot):
+    """Get the inverted token index of a trials snapshot, building it once per version"""
+    return trial_snapshot.get_derived(
+        ('token_index', tuple(TRIAL_MATCH_COLUMNS)),
+        lambda df: TrialTokenIndex(df[TRIAL_MATCH_COLUMNS], TRIAL_MATCH_COLUMNS)
+    )
+
+def get_trial_phenotype_index(trial_snapshot, cache_dir):
+    """Get the phenotype TF-IDF index of a trials snapshot, loading or building it once per version"""
+    return trial_snapshot.get_derived(
+        ('phenotype_index', PHENOTYPE_INDEX_FORMAT),
+        lambda df: load_phenotype_index(df, cache_dir)
+    )
+
+@st.cache_resource
+def get_gene_hit_cache():
+    """Get the gene hit cache shared by every session of this server"""
+    return GeneHitCache()
+
+def build_exclusion_columns(trials_df):
+    """Build a trials table's exclusion columns with the current categories' bitmask already packed"""
+    exclusion_columns = ExclusionColumns(trials_df)
+    exclusion_columns.get_bitmask(get_exclusion_patterns())
+    return exclusion_columns
+
+def get_trial_exclusion_bitmask(trial_snapshot):
+    """Get the exclusion-category bitmask of a trials snapshot
+    
+    Each category's match column is computed once per version, so adding a
+    custom category costs one pass for that category alone. A reload
+    rebuilds the columns and bitmask before the new version is served.
+    """
+    exclusion_columns = trial_snapshot.get_derived('exclusion_columns', build_exclusion_columns)
+    return exclusion_columns.get_bitmask(get_exclusion_patterns())
+
+def get_match_cache_version(table_version):
+    """Get the gene hit cache version - the trial content plus the custom categories it was filtered by"""
+    registry = get_exclusion_registry()
+    if table_version is None or not registry.patterns:
+        return table_version
+    return f"{table_version}+{registry.fingerprint}"
+
+def normalize_gene(gene):
+    """Normalize a patient's gene value the way every matching engine looks it up"""
+    return str(gene).upper()
+
+def find_gene_positions(gene, trials_df, exclusion_filters=None, positions=None, exclusion_bitmask=None):
+    """Find the row positions of the trials matching a normalized gene, after exclusions
+    
+    ``positions`` are the gene's matching row positions when already known
+    (from an index lookup or a hit table); otherwise the gene is scanned for.
+    With ``exclusion_bitmask`` (per-trial category bits) exclusion filters
+    are a bitwise AND instead of regexes.
+    """
+    if positions is not None:
+        positions = np.asarray(positions, dtype=np.int64)
+        if not exclusion_filters:
+            return positions
+        if exclusion_bitmask is not None:
+            keep = apply_exclusion_bitmask(exclusion_bitmask[positions], exclusion_filters)
+        else:
+            keep = apply_exclusion_filters(trials_df.iloc[positions], exclusion_filters).to_numpy(dtype=bool)
+        return positions[keep]
+    
+    gene_regex = create_gene_regex(gene)
+    
+    # Apply exclusion filters
+    if exclusion_bitmask is not None:
+        exclusion_mask = apply_exclusion_bitmask(exclusion_bitmask, exclusion_filters)
+    else:
+        exclusion_mask = apply_exclusion_filters(trials_df, exclusion_filters).to_numpy(dtype=bool)
+    
+    # Apply gene matching and exclusion filters
+    mask = (
+        exclusion_mask &
+        (
+            trials_df['StudyTitle'].str.contains(gene_regex, case=True, na=False) |
+            trials_df['BriefSummary'].str.contains(gene_regex, case=True, na=False)
+        )
+    )
+    return np.flatnonzero(mask.to_numpy(dtype=bool))
+
 def find_gene_matches(patient_row, trials_df, exclusion_filters=None):
     """Find gene matches with configurable exclusion filters - FIXED VERSION"""
     try:
-        gene = str(patient_row['Gene']).upper()
-        gene_regex = create_gene_regex(gene)
+        gene = normalize_gene(patient_row['Gene'])
+        matches = trials_df.take(find_gene_positions(gene, trials_df, exclusion_filters))
+        if matches.empty:
+            return None
         
-        # Apply exclusion filters
-        exclusion_mask = apply_exclusion_filters(trials_df, exclusion_filters)
-        
-        # Apply gene matching and exclusion filters
-        mask = (
-            exclusion_mask &
-            (
-                trials_df['StudyTitle'].str.contains(gene_regex, case=True, na=False) |
-                trials_df['BriefSummary'].str.contains(gene_regex, case=True, na=False)
-            )
+        # Patient information and trial information under their own prefixes
+        patient_part = pd.DataFrame(
+            {f"Patient_{col}": [patient_row[col]] * len(matches) for col in patient_row.index}
         )
-        
-        matches = trials_df[mask].copy()
-        
-        if not matches.empty:
-            # FIXED: Create results manually to avoid column conflicts
-            results = []
-            
-            # For each matching trial, create a row with patient info + trial info
-            for _, trial_row in matches.iterrows():
-                combined_row = {}
-                
-                # Add patient information with prefix
-                for col in patient_row.index:
-                    combined_row[f"Patient_{col}"] = patient_row[col]
-                
-                # Add trial information with prefix
-                for col in trial_row.index:
-                    combined_row[f"Trial_{col}"] = trial_row[col]
-                
-                results.append(combined_row)
-            
-            # Convert to DataFrame
-            if results:
-                combined_df = pd.DataFrame(results)
-                return combined_df
-        
-        return None
+        return pd.concat([patient_part, matches.add_prefix('Trial_').reset_index(drop=True)], axis=1)
         
     except Exception as e:
         # Log error but don't stop processing
@@ -102,66 +208,605 @@ def find_gene_matches(patient_row, trials_df, exclusion_filters=None):
         st.warning(f"⚠️ Error processing gene {patient_id}: {str(e)}")
         return None
 
-def process_trial_matching(patient_df, trial_df, exclusion_filters):
-    """Process trial matching for all patients with progress tracking - ENHANCED VERSION"""
+def get_row_value_keys(df):
+    """Give every row an integer key shared by all rows with identical values"""
+    if df.empty or len(df.columns) == 0:
+        return np.zeros(len(df), dtype=np.int64)
+    return df.groupby(list(df.columns), dropna=False, sort=False, observed=True).ngroup().to_numpy()
+
+def assemble_trial_matches(patient_df, patient_positions, trial_positions, fetch_trial_rows, pair_columns=None,
+                           patient_keys=None):
+    """Turn (patient, trial) position pairs into a compact match result without duplicate rows
+    
+    Every matched trial is fetched once to key its values; pairs whose
+    patient and trial rows both have identical values are dropped, so the
+    result equals a full-width ``drop_duplicates`` over the combined rows.
+    ``patient_keys`` are the patient table's row value keys when already
+    computed. ``pair_columns`` maps extra column names to arrays aligned
+    with the pairs. Returns ``(matches, duplicates_removed)``, with each
+    match labelled by its position among the pairs.
+    """
+    trial_ids = np.unique(trial_positions)
+    trial_keys = get_row_value_keys(fetch_trial_rows(trial_ids).reset_index(drop=True))
+    if patient_keys is None:
+        patient_keys = get_row_value_keys(patient_df)
+    
+    pair_keys = pd.DataFrame({
+        'patient': patient_keys[patient_positions],
+        'trial': trial_keys[np.searchsorted(trial_ids, trial_positions)]
+    })
+    keep = ~pair_keys.duplicated().to_numpy()
+    
+    matches = TrialMatchResult(
+        patient_df,
+        patient_positions[keep],
+        trial_positions[keep],
+        fetch_trial_rows,
+        {name: np.asarray(values)[keep] for name, values in (pair_columns or {}).items()},
+        np.flatnonzero(keep)
+    )
+    return matches, int(len(keep) - keep.sum())
+
+def match_distinct_gene(gene, trial_df, exclusion_filters, trial_store=None, token_index=None,
+                        cohort_positions=None, exclusion_bitmask=None):
+    """Get the sorted trial positions matching one distinct normalized gene, after exclusions"""
+    if trial_store is not None:
+        return np.asarray(trial_store.find_gene_ids(gene, exclusion_filters), dtype=np.int64)
+    
+    if cohort_positions is not None:
+        positions = cohort_positions.get(gene, [])
+    elif token_index is not None:
+        positions = token_index.find_gene_positions(gene)
+    else:
+        positions = None
+    return find_gene_positions(gene, trial_df, exclusion_filters, positions, exclusion_bitmask)
+
+def is_parallel_available():
+    """Check whether worker processes can inherit the trial tables through fork"""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+def get_match_texts(positions, trial_df=None, trial_store=None, **match_context):
+    """Get the title and summary of the trials at the given positions, in that order"""
+    if trial_store is not None:
+        return trial_store.fetch_rows(positions, TRIAL_MATCH_COLUMNS)
+    return trial_df[TRIAL_MATCH_COLUMNS].take(positions)
+
+def _match_gene_items(gene_items, match_context, ranking=None):
+    """Match (gene_code, gene, cached_positions) items, returning one result dict per gene
+    
+    Genes with cached positions skip the lookup; freshly matched positions
+    are returned as ``matched`` so the caller can cache them. With
+    ``ranking`` (``top_k`` and ``page``) only that page of the gene's
+    best-scoring trials is returned, with their scores.
+    """
+    results = []
+    for gene_code, gene, cached_positions in gene_items:
+        started = time.perf_counter()
+        result = {
+            'gene_code': gene_code, 'positions': None, 'scores': None, 'matched': None,
+            'total_hits': 0, 'error': None
+        }
+        try:
+            if cached_positions is None:
+                positions = result['matched'] = match_distinct_gene(gene, **match_context)
+            else:
+                positions = cached_positions
+            result['total_hits'] = len(positions)
+            if ranking is not None:
+                positions = np.sort(positions)
+                texts = get_match_texts(positions, **match_context)
+                positions, result['scores'] = rank_gene_hits(
+                    gene, positions, texts, ranking['top_k'], ranking['page']
+                )
+            result['positions'] = positions
+        except Exception as e:
+            result['error'] = str(e)
+        result['time_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        results.append(result)
+    return results
+
+def _init_match_worker():
+    """Worker process setup - SQLite connections must not be shared across fork"""
+    trial_store = _POOL_CONTEXT['match'].get('trial_store')
+    if trial_store is not None:
+        trial_store.reset_connections()
+
+def _match_gene_chunk(gene_items):
+    """Worker process task: match a chunk of genes against the fork-inherited context"""
+    return _match_gene_items(gene_items, _POOL_CONTEXT['match'], _POOL_CONTEXT['ranking'])
+
+def iter_gene_matches(gene_items, match_context, workers=1, ranking=None):
+    """Yield lists of per-gene match results as they complete
+    
+    With more than one worker the genes are split into chunks across a
+    process pool. Workers are forked after the context is published, so
+    the trial table, its index and bitmask are shared copy-on-write rather
+    than pickled per task. Callers order results by gene code, so the
+    merge is deterministic whatever order chunks finish in.
+    """
+    if workers <= 1 or len(gene_items) <= 1 or not is_parallel_available():
+        for gene_item in gene_items:
+            yield _match_gene_items([gene_item], match_context, ranking)
+        return
+    
+    chunk_size = max(1, math.ceil(len(gene_items) / (workers * CHUNKS_PER_WORKER)))
+    chunks = [gene_items[start:start + chunk_size] for start in range(0, len(gene_items), chunk_size)]
+    
+    # One pool start at a time - concurrent sessions would overwrite each other's context.
+    # A fork pool starts all its workers on the first submit, so once the tasks are
+    # queued every worker holds its own copy and the lock is not held while yielding.
+    with _POOL_LOCK:
+        _POOL_CONTEXT.clear()
+        _POOL_CONTEXT.update({'match': match_context, 'ranking': ranking})
+        try:
+            executor = ProcessPoolExecutor(
+                max_workers=min(workers, len(chunks)),
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_match_worker
+            )
+            try:
+                futures = [executor.submit(_match_gene_chunk, chunk) for chunk in chunks]
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+        finally:
+            _POOL_CONTEXT.clear()
+    
+    with executor:
+        for future in as_completed(futures):
+            yield future.result()
+
+def factorize_genes(patient_df):
+    """Encode each patient's normalized gene as a code into the cohort's distinct genes"""
+    return pd.factorize(patient_df['Gene'].map(normalize_gene))
+
+def iter_trial_match_chunks(patient_df, trial_df, exclusion_filters, trial_store=None, fetch_trial_rows=None,
+                            token_index=None, cohort_positions=None, exclusion_bitmask=None, workers=1,
+                            ranking=None, hit_cache=None, cache_version=None, scan_cohort=False):
+    """Match a cohort gene by gene, yielding a result chunk as each batch of genes completes
+    
+    With ``scan_cohort`` and no ``cohort_positions``, the genes the hit
+    cache cannot answer are matched in one pass over the trial text.
+    A chunk covers every patient of the genes it completes, so its matches
+    are already deduplicated - identical rows always share a gene. Each
+    chunk is a dict with the ``matches`` as a ``TrialMatchResult`` (or
+    None), the ``gene_stats`` and ``errors`` (gene code, message) of its
+    genes, ``hit_counts`` by gene code, ``duplicates_removed``, and
+    ``pair_offsets`` giving each match's rank among its patient's hits,
+    from which the cohort-wide row order is restored.
+    """
+    gene_codes, distinct_genes = factorize_genes(patient_df)
+    
+    # Patient positions per gene code, in patient order
+    patient_order = np.argsort(gene_codes, kind='stable')
+    gene_bounds = np.searchsorted(gene_codes[patient_order], np.arange(len(distinct_genes) + 1))
+    patient_counts = np.diff(gene_bounds)
+    patient_keys = get_row_value_keys(patient_df)
+    
+    # Full records are fetched once per matched trial, however many patients share it
+    if trial_store is not None:
+        fetch_rows = trial_store.fetch_rows
+    elif fetch_trial_rows is not None:
+        fetch_rows = fetch_trial_rows
+    else:
+        fetch_rows = trial_df.take
+    
+    # Reuse hits cached by any session for this exact trial content and filter set
+    cache_keys = None
+    cached_positions = [None] * len(distinct_genes)
+    if hit_cache is not None and cache_version is not None:
+        hit_cache.bind_version(cache_version)
+        engine = 'sqlite' if trial_store is not None else 'memory'
+        cache_keys = [
+            hit_cache.make_key(cache_version, engine, gene, exclusion_filters) for gene in distinct_genes
+        ]
+        cached_positions = [hit_cache.get(key) for key in cache_keys]
+    
+    if scan_cohort and trial_store is None and cohort_positions is None:
+        scan_genes = [gene for gene, positions in zip(distinct_genes, cached_positions) if positions is None]
+        cohort_positions = {}
+        if scan_genes:
+            cohort_positions = group_gene_hits(scan_cohort_genes(trial_df, scan_genes, TRIAL_MATCH_COLUMNS))
+    
+    match_context = {
+        'trial_df': trial_df,
+        'exclusion_filters': exclusion_filters,
+        'trial_store': trial_store,
+        'token_index': token_index,
+        'cohort_positions': cohort_positions,
+        'exclusion_bitmask': exclusion_bitmask
+    }
+    gene_items = [
+        (gene_code, gene, cached_positions[gene_code]) for gene_code, gene in enumerate(distinct_genes)
+    ]
+    first_rank = ranking['top_k'] * (ranking['page'] - 1) + 1 if ranking is not None else None
+    
+    for chunk_results in iter_gene_matches(gene_items, match_context, workers, ranking):
+        chunk = {
+            'matches': None, 'gene_stats': [], 'errors': [], 'hit_counts': {}, 'duplicates_removed': 0,
+            'pair_offsets': np.empty(0, dtype=np.int64)
+        }
+        matched_results = []
+        for result in chunk_results:
+            gene_code = result['gene_code']
+            gene = distinct_genes[gene_code]
+            if result['error'] is not None:
+                chunk['errors'].append((gene_code, result['error']))
+            else:
+                if cache_keys is not None and result['matched'] is not None:
+                    hit_cache.put(cache_keys[gene_code], result['matched'])
+                chunk['hit_counts'][gene_code] = len(result['positions'])
+                matched_results.append(result)
+            
+            gene_stat = {
+                'Gene': gene,
+                'Patients': int(patient_counts[gene_code]),
+                'Trial Hits': result['total_hits'],
+                'Time (ms)': result['time_ms']
+            }
+            if cache_keys is not None:
+                gene_stat['Cached'] = cached_positions[gene_code] is not None
+            if ranking is not None:
+                gene_stat['Returned'] = len(result['positions']) if result['positions'] is not None else 0
+            chunk['gene_stats'].append(gene_stat)
+        
+        # Fan each gene's hits out to its patients: (patient position, trial position)
+        # pairs, in patient order then trial order
+        matched_results = [result for result in matched_results if len(result['positions']) > 0]
+        if matched_results:
+            patients = np.sort(np.concatenate([
+                patient_order[gene_bounds[result['gene_code']]:gene_bounds[result['gene_code'] + 1]]
+                for result in matched_results
+            ]))
+            result_by_code = {result['gene_code']: result for result in matched_results}
+            patient_results = [result_by_code[code] for code in gene_codes[patients]]
+            hit_counts = [len(result['positions']) for result in patient_results]
+            
+            pair_patients = np.repeat(patients, hit_counts)
+            pair_trials = np.concatenate([result['positions'] for result in patient_results])
+            pair_offsets = np.concatenate([np.arange(count) for count in hit_counts])
+            
+            # Ranked runs carry each pair's rank and score; hits are already best first
+            pair_columns = None
+            if ranking is not None:
+                pair_columns = {
+                    'Match_Rank': first_rank + pair_offsets,
+                    'Match_Score': np.concatenate([result['scores'] for result in patient_results])
+                }
+            
+            chunk['matches'], chunk['duplicates_removed'] = assemble_trial_matches(
+                patient_df, pair_patients, pair_trials, fetch_rows, pair_columns, patient_keys
+            )
+            chunk['pair_offsets'] = pair_offsets[chunk['matches'].index]
+        
+        yield chunk
+
+def process_trial_matching(patient_df, trial_df, exclusion_filters, trial_store=None, fetch_trial_rows=None,
+                           token_index=None, scan_cohort=False, exclusion_bitmask=None, workers=1,
+                           top_k=None, page=1, hit_cache=None, cache_version=None):
+    """Process trial matching for all patients with progress tracking - ENHANCED VERSION
+    
+    The cohort is collapsed to its distinct normalized genes; each gene is
+    matched once and its hits fanned back out to every patient carrying it,
+    so runtime follows the number of distinct genes rather than rows.
+    Results stream into a live table as genes complete. Returns a compact
+    ``TrialMatchResult`` in patient order, then trial order; rows are only
+    built for the page being shown or when exporting.
+    
+    When ``trial_store`` is given, lookups run as indexed SQLite FTS5 queries
+    and ``trial_df`` is not needed. Otherwise ``trial_df`` may be a projection
+    of the matching columns, with ``fetch_trial_rows`` supplying full records.
+    Genes are looked up in ``token_index`` or, with ``scan_cohort``, matched
+    in one pass over the trial text for all genes at once.
+    ``exclusion_bitmask`` turns exclusion filters into a bitwise AND.
+    With ``workers`` above one, distinct genes are matched in parallel
+    worker processes. With ``top_k``, matches are ranked by relevance and
+    each patient keeps only page ``page`` of its ``top_k`` best trials, with
+    Match_Rank and Match_Score columns. With a ``hit_cache`` and the trial
+    table's ``cache_version``, genes already matched under the same filters
+    by any session are reused instead of looked up again - and left out of
+    the cohort scan.
+    """
+    gene_codes, distinct_genes = factorize_genes(patient_df)
     
     # Show debug info in an expander
-    with st.expander("🔍 Debug Information", expanded=False):
+    debug_panel = st.expander("🔍 Debug Information", expanded=False)
+    with debug_panel:
         st.write(f"**Patient data shape:** {patient_df.shape}")
         st.write(f"**Patient columns:** {list(patient_df.columns)}")
-        st.write(f"**Trial data shape:** {trial_df.shape}")
-        st.write(f"**Trial columns (first 10):** {list(trial_df.columns)[:10]}")
+        st.write(f"**Distinct genes:** {len(distinct_genes):,} across {len(patient_df):,} patients")
+        if workers > 1:
+            st.write(f"**Worker processes:** {workers}")
+        if trial_store is not None:
+            st.write(f"**Trial store:** SQLite FTS5 • {trial_store.row_count():,} trials")
+            st.write(f"**Trial columns (first 10):** {trial_store.columns[:10]}")
+        else:
+            st.write(f"**Trial data shape:** {trial_df.shape}")
+            st.write(f"**Trial columns (first 10):** {list(trial_df.columns)[:10]}")
+            if token_index is not None:
+                token_counts = ', '.join(f"{field}: {len(postings):,}" for field, postings in token_index.postings.items())
+                st.write(f"**Token index:** distinct tokens per field - {token_counts}")
+            if scan_cohort:
+                st.write("**Cohort scan:** one pass over the trial text for the genes not already cached")
         
         # Show sample data
         if not patient_df.empty:
             st.write("**Sample patient data:**")
             st.dataframe(patient_df.head(2), use_container_width=True)
     
-    progress_total = len(patient_df)
-    progress_bar = st.progress(0, text="Initializing matching algorithm...")
-
-    results = []
-    failed_count = 0
+    progress = ProgressReporter(len(distinct_genes), "Matching genes")
+    live_results = LiveResultsTable("Live results")
+    ranking = {'top_k': int(top_k), 'page': int(page)} if top_k else None
+    
+    patient_counts = np.bincount(gene_codes, minlength=len(distinct_genes))
+    hit_counts_by_gene = np.zeros(len(distinct_genes), dtype=np.int64)
+    failed_genes = np.zeros(len(distinct_genes), dtype=bool)
+    match_chunks = []
+    gene_stats = []
+    duplicate_count = 0
+    matched_patients = 0
+    match_count = 0
+    patients_done = 0
+    
+    try:
+        for chunk in iter_trial_match_chunks(
+            patient_df, trial_df, exclusion_filters, trial_store, fetch_trial_rows, token_index,
+            None, exclusion_bitmask, workers, ranking, hit_cache, cache_version, scan_cohort
+        ):
+            for gene_code, error in chunk['errors']:
+                st.warning(f"⚠️ Failed to process gene {distinct_genes[gene_code]}: {error}")
+                failed_genes[gene_code] = True
+            for code, count in chunk['hit_counts'].items():
+                hit_counts_by_gene[code] = count
+            gene_stats.extend(chunk['gene_stats'])
+            duplicate_count += chunk['duplicates_removed']
+            patients_done += sum(stat['Patients'] for stat in chunk['gene_stats'])
+            
+            if chunk['matches'] is not None:
+                match_chunks.append(chunk)
+                match_count += len(chunk['matches'])
+                matched_patients += chunk['matches'].count_unique_patients(id_column=None)
+            
+            # Rows are only built for the part of the chunk the preview still shows
+            preview = None
+            if chunk['matches'] is not None and live_results.rows_wanted > 0:
+                preview = chunk['matches'].materialize(0, live_results.rows_wanted)
+            live_results.append(preview, {
+                'Matches': f"{match_count:,}",
+                'Patients matched': f"{matched_patients:,}",
+                'Patients done': f"{patients_done:,}/{len(patient_df):,}",
+                'Genes done': f"{len(gene_stats):,}/{len(distinct_genes):,}"
+            })
+            progress.advance(len(chunk['gene_stats']))
+    finally:
+        live_results.finish()
+    
+    with debug_panel:
+        if hit_cache is not None:
+            st.write("**Gene hit cache (all sessions):**")
+            st.dataframe(pd.DataFrame([hit_cache.get_stats()]), use_container_width=True, hide_index=True)
+        if gene_stats:
+            st.write("**Per-gene matching:**")
+            st.dataframe(
+                pd.DataFrame(gene_stats).sort_values('Time (ms)', ascending=False),
+                use_container_width=True, hide_index=True
+            )
     
-    for i, row in patient_df.iterrows():
-        try:
-            update_progress(progress_bar, i + 1, progress_total, f"Processing patient {i+1}")
-            match_df = find_gene_matches(row, trial_df, exclusion_filters)
-            if match_df is not None and len(match_df) > 0:
-                results.append(match_df)
-        except Exception as e:
-            failed_count += 1
-            patient_id = row.get('PatientID', f'Patient_{i+1}')
-            st.warning(f"⚠️ Failed to process {patient_id}: {str(e)}")
-            continue
-        
-        time.sleep(0.01)  # Small delay for visual effect
-
     # Show summary
+    failed_count = int(patient_counts[failed_genes].sum())
     if failed_count > 0:
         st.warning(f"⚠️ {failed_count} patients failed to process")
     
-    if results:
+    fetch_rows = trial_store.fetch_rows if trial_store is not None else fetch_trial_rows or trial_df.take
+    if match_chunks:
         try:
-            # Combine all results
-            matched_df = pd.concat(results, ignore_index=True)
-            
-            # Remove exact duplicates
-            initial_rows = len(matched_df)
-            matched_df = matched_df.drop_duplicates()
-            final_rows = len(matched_df)
+            # Put chunks back in patient order, then trial order: each row's index is its
+            # position among all (patient, trial) pairs before duplicates were removed
+            patient_hit_counts = hit_counts_by_gene[gene_codes]
+            pair_starts = np.cumsum(patient_hit_counts) - patient_hit_counts
+            matches = TrialMatchResult.concat([chunk['matches'] for chunk in match_chunks], patient_df, fetch_rows)
+            matches.index = np.concatenate([
+                pair_starts[chunk['matches'].patient_positions] + chunk['pair_offsets'] for chunk in match_chunks
+            ])
+            matches = matches.sort_index()
             
-            if initial_rows > final_rows:
-                st.info(f"ℹ️ Removed {initial_rows - final_rows} duplicate matches")
+            if duplicate_count > 0:
+                st.info(f"ℹ️ Removed {duplicate_count} duplicate matches")
             
             st.success(f"✅ Successfully processed {len(patient_df) - failed_count}/{len(patient_df)} patients")
-            return matched_df
+            return matches
             
         except Exception as e:
             st.error(f"❌ Error combining results: {str(e)}")
-            return pd.DataFrame()
     
-    return pd.DataFrame()
+    return TrialMatchResult(patient_df, [], [], fetch_rows)
+
+def process_cohort_matrix_matching(patient_df, trial_df, exclusion_filters, fetch_trial_rows=None,
+                                   token_index=None, exclusion_bitmask=None):
+    """Match a long-format cohort (many gene rows per patient) in one sparse matrix product
+    
+    The cohort becomes a patient x gene incidence matrix and the trial text
+    a gene x trial matrix from ``token_index`` (or a one-pass scan); their
+    product counts, for every patient and trial, how many of the patient's
+    genes match. Exclusion filters drop trial columns before the product.
+    Returns a ``TrialMatchResult`` with one row per patient and trial: a
+    Patient_ summary (ID, genes, gene count, trial matches) plus a
+    Matched_Genes count.
+    """
+    started = time.perf_counter()
+    gene_codes, distinct_genes = factorize_genes(patient_df)
+    patient_codes, patient_ids = pd.factorize(patient_df['PatientID'], use_na_sentinel=False)
+    
+    cohort_positions = None
+    if token_index is None:
+        cohort_positions = group_gene_hits(scan_cohort_genes(trial_df, list(distinct_genes), TRIAL_MATCH_COLUMNS))
+    gene_positions = [
+        match_distinct_gene(gene, trial_df, None, token_index=token_index, cohort_positions=cohort_positions)
+        for gene in distinct_genes
+    ]
+    
+    trial_keep = None
+    if exclusion_filters:
+        if exclusion_bitmask is not None:
+            trial_keep = apply_exclusion_bitmask(exclusion_bitmask, exclusion_filters)
+        else:
+            trial_keep = apply_exclusion_filters(trial_df, exclusion_filters).to_numpy(dtype=bool)
+    
+    patient_gene = build_patient_gene_matrix(patient_codes, gene_codes, len(patient_ids), len(distinct_genes))
+    gene_trial = build_gene_trial_matrix(gene_positions, len(trial_df))
+    matches = match_cohort_matrix(patient_gene, gene_trial, trial_keep)
+    patient_positions, trial_positions, gene_counts = get_match_pairs(matches)
+    
+    # One summary row per patient, genes in the order they were listed
+    first_rows = pd.DataFrame({'patient': patient_codes, 'gene': gene_codes}).drop_duplicates()
+    first_rows = first_rows.sort_values('patient', kind='stable')
+    patient_gene_lists = np.split(
+        distinct_genes.to_numpy()[first_rows['gene'].to_numpy()],
+        np.cumsum(np.bincount(first_rows['patient'].to_numpy(), minlength=len(patient_ids)))[:-1]
+    )
+    patient_summary = pd.DataFrame({
+        'PatientID': patient_ids,
+        'Genes': ['; '.join(genes) for genes in patient_gene_lists],
+        'Gene Count': np.diff(patient_gene.indptr),
+        'Trial Matches': get_match_counts(matches)
+    })
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    with st.expander("🔍 Debug Information", expanded=False):
+        st.write(f"**Cohort:** {len(patient_df):,} gene rows • {len(patient_ids):,} patients • {len(distinct_genes):,} distinct genes")
+        st.dataframe(pd.DataFrame([
+            {'Matrix': 'Patient x gene', 'Shape': str(patient_gene.shape), 'Non-zeros': patient_gene.nnz},
+            {'Matrix': 'Gene x trial', 'Shape': str(gene_trial.shape), 'Non-zeros': gene_trial.nnz},
+            {'Matrix': 'Patient x trial', 'Shape': str(matches.shape), 'Non-zeros': matches.nnz}
+        ]), use_container_width=True, hide_index=True)
+        st.write(f"**Matching time:** {elapsed_ms:,.1f} ms")
+    
+    st.success(f"✅ Matched {len(patient_ids):,} patients in one sparse product")
+    return TrialMatchResult(
+        patient_summary, patient_positions, trial_positions, fetch_trial_rows or trial_df.take,
+        {'Matched_Genes': gene_counts}
+    )
+
+def process_phenotype_matching(patient_df, trial_df, exclusion_filters, phenotype_index, fetch_trial_rows=None,
+                               exclusion_bitmask=None, top_k=DEFAULT_PHENOTYPE_TOP_K):
+    """Match every patient's phenotype text to the most similar trials
+    
+    Phenotypes are scored against the trial TF-IDF matrix in batched sparse
+    products, with excluded trials dropped as columns. Returns a
+    ``TrialMatchResult`` of each patient's ``top_k`` trials, best first, with
+    Phenotype_Rank and Phenotype_Score columns.
+    """
+    started = time.perf_counter()
+    trial_keep = None
+    if exclusion_filters:
+        if exclusion_bitmask is not None:
+            trial_keep = apply_exclusion_bitmask(exclusion_bitmask, exclusion_filters)
+        else:
+            trial_keep = apply_exclusion_filters(trial_df, exclusion_filters).to_numpy(dtype=bool)
+    
+    patient_positions, trial_positions, scores = phenotype_index.top_k(
+        patient_df['Phenotype'].to_numpy(), int(top_k), trial_keep
+    )
+    # Rank within each patient's run of results
+    run_starts = np.flatnonzero(np.r_[True, patient_positions[1:] != patient_positions[:-1]]) if len(patient_positions) else np.empty(0, dtype=np.int64)
+    run_lengths = np.diff(np.r_[run_starts, len(patient_positions)])
+    ranks = np.arange(len(patient_positions)) - np.repeat(run_starts, run_lengths) + 1
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    with st.expander("🔍 Debug Information", expanded=False):
+        st.write(f"**Patients:** {len(patient_df):,} • with a matched phenotype: {len(run_starts):,}")
+        st.write(
+            f"**TF-IDF index:** {len(phenotype_index.vocabulary):,} terms • "
+            f"{phenotype_index.trial_terms.nnz:,} non-zeros over {phenotype_index.trial_terms.shape[0]:,} trials"
+        )
+        st.write(f"**Scoring time:** {elapsed_ms:,.1f} ms")
+    
+    st.success(f"✅ Scored {len(patient_df):,} phenotypes against every trial")
+    return TrialMatchResult(
+        patient_df, patient_positions, trial_positions, fetch_trial_rows or trial_df.take,
+        {'Phenotype_Rank': ranks, 'Phenotype_Score': np.round(scores.astype(float), 4)}
+    )
+
+def count_trial_matches(patient_df, trial_df, exclusion_filters, token_index=None, exclusion_bitmask=None):
+    """Count what a gene match run would return, without building any match rows
+    
+    Each distinct gene is looked up once without exclusions (through
+    ``token_index``, or a one-pass scan), and its hits are counted against
+    the trials' exclusion-category bits. Returns ``(gene_counts,
+    patient_counts)`` frames: per gene its patients, trials before and after
+    the selected filters, match rows, and per category the trials toggling
+    that category alone would add or remove; per patient its gene rows and
+    match rows. Identical patient rows count once, as in a full run.
+    """
+    exclusion_patterns = get_exclusion_patterns()
+    if exclusion_bitmask is None:
+        exclusion_bitmask = compute_exclusion_bitmask(trial_df, exclusion_patterns)
+    
+    distinct_rows = ~pd.Series(get_row_value_keys(patient_df)).duplicated().to_numpy()
+    patient_df = patient_df[distinct_rows]
+    gene_codes, distinct_genes = factorize_genes(patient_df)
+    
+    cohort_positions = None
+    if token_index is None:
+        cohort_positions = group_gene_hits(scan_cohort_genes(trial_df, list(distinct_genes), TRIAL_MATCH_COLUMNS))
+    gene_positions = [
+        match_distinct_gene(gene, trial_df, None, token_index=token_index, cohort_positions=cohort_positions)
+        for gene in distinct_genes
+    ]
+    
+    trials, kept, toggles = count_gene_facets(
+        gene_positions, exclusion_bitmask, get_exclusion_bits(exclusion_filters, exclusion_patterns),
+        len(exclusion_patterns)
+    )
+    patients = np.bincount(gene_codes, minlength=len(distinct_genes))
+    gene_counts = pd.DataFrame({
+        'Gene': distinct_genes,
+        'Patients': patients,
+        'Trials': trials,
+        'After Filters': kept,
+        'Match Rows': patients * kept
+    })
+    for bit, filter_name in enumerate(exclusion_patterns):
+        sign = '+' if filter_name in (exclusion_filters or []) else '−'
+        gene_counts[f"{sign} {filter_name}"] = toggles[:, bit]
+    
+    patient_codes, patient_ids = pd.factorize(patient_df['PatientID'], use_na_sentinel=False)
+    patient_counts = pd.DataFrame({
+        'PatientID': patient_ids,
+        'Gene Rows': np.bincount(patient_codes, minlength=len(patient_ids)),
+        'Match Rows': np.bincount(patient_codes, weights=kept[gene_codes], minlength=len(patient_ids)).astype(np.int64)
+    })
+    return gene_counts, patient_counts
+
+def display_match_count_preview(patient_data, exclusion_filters, trial_snapshot):
+    """Show the dry-run match counts for the current filters"""
+    started = time.perf_counter()
+    gene_counts, patient_counts = count_trial_matches(
+        patient_data, trial_snapshot.project(TRIAL_MATCH_COLUMNS), exclusion_filters,
+        token_index=get_trial_token_index(trial_snapshot),
+        exclusion_bitmask=get_trial_exclusion_bitmask(trial_snapshot)
+    )
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Match Rows", f"{int(gene_counts['Match Rows'].sum()):,}")
+    with col2:
+        st.metric("Patients With Matches", f"{int((patient_counts['Match Rows'] > 0).sum()):,} / {len(patient_counts):,}")
+    with col3:
+        st.metric("Genes With Matches", f"{int((gene_counts['After Filters'] > 0).sum()):,} / {len(gene_counts):,}")
+    
+    st.caption(
+        f"Counted in {elapsed_ms:,.1f} ms without building any rows. "
+        "Category columns show the trials ticking (−) or unticking (+) that filter alone would change per gene; "
+        "trials with identical content are only merged by a full run."
+    )
+    gene_tab, patient_tab = st.tabs(["🧬 By gene", "👥 By patient"])
+    with gene_tab:
+        st.dataframe(gene_counts.sort_values('Match Rows', ascending=False, kind='stable'),
+                     use_container_width=True, hide_index=True)
+    with patient_tab:
+        st.dataframe(patient_counts, use_container_width=True, hide_index=True)
 
 def run_trial_matcher_with_data(patient_data):
     """Enhanced trial matcher using provided patient data"""
@@ -179,73 +824,224 @@ def run_trial_matcher_with_data(patient_data):
     # Backend Database Status Check
     st.markdown("**🗄️ Backend Database Status**")
     
+    repository = get_backend_repository()
     col1, col2 = st.columns(2)
     
     with col1:
         # Check clinical trials database
         try:
-            trial_count = load_backend_trial_database(check_only=True)
+            trial_count = repository.check_available('clinical_trials')
             st.success(f"✅ Clinical Trials DB: {trial_count:,} active trials")
             
             # Show file date if available
-            if 'databases' in st.session_state and st.session_state['databases'].get('file_dates'):
-                file_date = st.session_state['databases']['file_dates'].get('clinical_trials', 'Unknown')
-                st.info(f"📅 File Date: {file_date}")
+            st.info(f"📅 File Date: {repository.get_file_date('clinical_trials')}")
             
         except Exception as e:
             st.error(f"❌ Clinical Trials DB: {str(e)}")
     
     with col2:
         # Show database version info
-        st.info("📊 Database Version: v2.1")
+        st.info(f"📊 Database Version: {repository.get_version_summary('clinical_trials')[0]}")
         st.info("🔄 System Status: Active")
 
-    # Show exclusion filters
-    selected_filters = create_exclusion_filters()
+    # Show exclusion filters, with per-category trial counts once the trials table is loaded
+    exclusion_counts = None
+    if repository.is_loaded('clinical_trials'):
+        exclusion_counts = count_exclusions(get_trial_exclusion_bitmask(repository.snapshot('clinical_trials')))
+    selected_filters = create_exclusion_filters(exclusion_counts)
+    
+    # Phenotype similarity needs scipy for its sparse TF-IDF matrix
+    match_mode = MATCH_MODES[0]
+    if is_phenotype_matching_available():
+        match_mode = st.radio(
+            "Match by:",
+            MATCH_MODES,
+            horizontal=True,
+            key="trial_match_mode",
+            help=(
+                "Gene matches trials naming the patient's gene; phenotype similarity scores the "
+                "patient's phenotype text against trial titles and summaries (TF-IDF)"
+            )
+        )
+    phenotype_mode = match_mode == MATCH_MODES[1]
+    
+    search_engine = SEARCH_ENGINES[0]
+    phenotype_top_k = DEFAULT_PHENOTYPE_TOP_K
+    if phenotype_mode:
+        phenotype_top_k = int(st.number_input(
+            "Top trials per patient:",
+            min_value=1,
+            value=DEFAULT_PHENOTYPE_TOP_K,
+            step=5,
+            key="trial_phenotype_top_k"
+        ))
+    else:
+        # The SQLite storage engine is only offered when the local SQLite build has FTS5,
+        # the sparse batch mode when scipy is installed
+        available_engines = [
+            engine for engine in SEARCH_ENGINES
+            if (engine != SEARCH_ENGINES[1] or is_fts5_available()) and (engine != SEARCH_ENGINES[3] or is_sparse_available())
+        ]
+        search_engine = st.radio(
+            "Search engine:",
+            available_engines,
+            horizontal=True,
+            key="trial_search_engine",
+            help=(
+                "In-memory looks genes up in a token index built once per database version; "
+                "the one-pass scan matches the whole cohort's genes in a single pass without keeping an index; "
+                "SQLite imports the trials file once and answers gene lookups from an FTS5 index; "
+                "the sparse batch mode matches a long-format cohort as one matrix product, one row per patient and trial"
+            )
+        )
+    
+    # Phenotype and sparse batch matching score the whole cohort at once - no workers or ranking
+    batch_mode = phenotype_mode or search_engine == SEARCH_ENGINES[3]
+    
+    # Parallel matching for large cohorts on multi-core machines
+    workers = 1
+    cpu_count = os.cpu_count() or 1
+    if is_parallel_available() and cpu_count > 1 and not batch_mode:
+        workers = int(st.number_input(
+            "⚙️ Worker processes:",
+            min_value=1,
+            max_value=cpu_count,
+            value=1,
+            step=1,
+            key="trial_worker_processes",
+            help="Distinct genes are split across this many processes; 1 matches in the app process"
+        ))
+    
+    # Relevance ranking keeps each patient's output bounded for common genes
+    top_k = None
+    result_page = 1
+    if not batch_mode and st.checkbox(
+        "📈 Rank matches by relevance",
+        key="trial_rank_matches",
+        help=(
+            "Scores trials by where the gene appears (title over summary), how often, "
+            "and whether it sits close to an exclusion-category term; keeps the best per patient"
+        )
+    ):
+        col1, col2 = st.columns(2)
+        with col1:
+            top_k = int(st.number_input(
+                "Top results per patient:",
+                min_value=1,
+                value=DEFAULT_TOP_K,
+                step=5,
+                key="trial_top_k"
+            ))
+        with col2:
+            result_page = int(st.number_input(
+                "Page:",
+                min_value=1,
+                value=1,
+                step=1,
+                key="trial_result_page"
+            ))
+    
+    # Dry run: counts only, recomputed on every filter change
+    if not phenotype_mode and st.checkbox(
+        "🧮 Preview match counts (dry run)",
+        key="trial_dry_run",
+        help="Counts matches per gene and patient under the selected filters without running the match"
+    ):
+        if not all(column in patient_data.columns for column in ['PatientID', 'Gene']):
+            st.warning("⚠️ Match count preview needs PatientID and Gene columns")
+        else:
+            try:
+                trial_snapshot = repository.snapshot('clinical_trials')
+                if trial_snapshot.df is None or trial_snapshot.df.empty:
+                    st.error(f"❌ Failed to load clinical trials database: {trial_snapshot.status}")
+                else:
+                    display_match_count_preview(patient_data, selected_filters, trial_snapshot)
+            except Exception as e:
+                st.error(f"❌ Error counting matches: {str(e)}")
     
     st.markdown("---")
     
     # Enhanced button with loading state
     if st.button("🔍 **Start Matching Process**", use_container_width=True, key="start_trial_matching"):
+        st.session_state.pop(TRIAL_RESULTS_KEY, None)
         with create_loading_context("Loading backend database and finding matches..."):
             try:
                 # Validate patient file structure
-                required_columns = ['PatientID', 'Gene']
+                required_columns = ['PatientID', 'Phenotype' if phenotype_mode else 'Gene']
                 if not validate_file_structure(patient_data, required_columns, "Patient"):
                     st.error("❌ Patient data validation failed.")
                     return
                 
-                # Load backend clinical trials database
-                trial_df = load_backend_trial_database()
-                if trial_df.empty:
-                    st.error("❌ Failed to load clinical trials database.")
-                    return
-                
-                # Validate trial database has required columns
-                required_trial_columns = ['StudyTitle', 'BriefSummary']
-                missing_trial_cols = [col for col in required_trial_columns if col not in trial_df.columns]
-                if missing_trial_cols:
-                    st.error(f"❌ Trial database missing columns: {', '.join(missing_trial_cols)}")
-                    return
-                
-                # Process matching
-                matched_df = process_trial_matching(patient_data, trial_df, selected_filters)
+                if search_engine == SEARCH_ENGINES[1]:
+                    # Indexed lookups - the trials table is never loaded into memory
+                    trial_store = repository.get_trial_store()
+                    trial_count = trial_store.row_count()
+                    matches = process_trial_matching(
+                        patient_data, None, selected_filters, trial_store, workers=workers,
+                        top_k=top_k, page=result_page,
+                        hit_cache=get_gene_hit_cache(), cache_version=get_match_cache_version(trial_store.version)
+                    )
+                else:
+                    # One snapshot for the whole run, so a hot reload cannot mix versions
+                    trial_snapshot = repository.snapshot('clinical_trials')
+                    if trial_snapshot.df is None or trial_snapshot.df.empty:
+                        st.error(f"❌ Failed to load clinical trials database: {trial_snapshot.status}")
+                        return
+                    
+                    # Scan only the text columns; full records are fetched for matches alone
+                    trial_df = trial_snapshot.project(TRIAL_MATCH_COLUMNS)
+                    trial_count = len(trial_df)
+                    if phenotype_mode:
+                        phenotype_index = get_trial_phenotype_index(
+                            trial_snapshot, get_cache_dir(repository.get_file_path('clinical_trials'))
+                        )
+                        matches = process_phenotype_matching(
+                            patient_data, trial_df, selected_filters, phenotype_index,
+                            fetch_trial_rows=trial_snapshot.fetch_rows,
+                            exclusion_bitmask=get_trial_exclusion_bitmask(trial_snapshot),
+                            top_k=phenotype_top_k
+                        )
+                    elif search_engine == SEARCH_ENGINES[3]:
+                        matches = process_cohort_matrix_matching(
+                            patient_data, trial_df, selected_filters,
+                            fetch_trial_rows=trial_snapshot.fetch_rows,
+                            token_index=get_trial_token_index(trial_snapshot),
+                            exclusion_bitmask=get_trial_exclusion_bitmask(trial_snapshot)
+                        )
+                    else:
+                        scan_cohort = search_engine == SEARCH_ENGINES[2]
+                        matches = process_trial_matching(
+                            patient_data, trial_df, selected_filters,
+                            fetch_trial_rows=trial_snapshot.fetch_rows,
+                            token_index=None if scan_cohort else get_trial_token_index(trial_snapshot),
+                            scan_cohort=scan_cohort,
+                            exclusion_bitmask=get_trial_exclusion_bitmask(trial_snapshot),
+                            workers=workers,
+                            top_k=top_k,
+                            page=result_page,
+                            hit_cache=get_gene_hit_cache(),
+                            cache_version=get_match_cache_version(trial_snapshot.version)
+                        )
                 
                 # Prepare additional info for display
                 additional_info = []
                 if selected_filters:
                     additional_info.append(f"🎛️ **Filters Applied:** {', '.join(selected_filters)}")
+                if top_k:
+                    additional_info.append(f"📈 **Ranked:** top {top_k} per patient, page {result_page}")
+                if phenotype_mode:
+                    additional_info.append(f"🩺 **Phenotype similarity:** top {phenotype_top_k} trials per patient")
                 
-                if len(matched_df) > 0:
-                    success_rate = f"{(len(matched_df)/len(patient_data)*100):.1f}%"
+                if len(matches) > 0:
+                    success_rate = f"{(len(matches)/len(patient_data)*100):.1f}%"
                     additional_info.extend([
                         f"📊 **Success Rate:** {success_rate}",
-                        f"🗄️ **Database:** {len(trial_df):,} trials searched",
+                        f"🗄️ **Database:** {trial_count:,} trials searched",
                         f"👥 **Patients Processed:** {len(patient_data)}",
-                        f"🎯 **Total Matches:** {len(matched_df)}"
+                        f"🎯 **Total Matches:** {len(matches)}"
                     ])
                     
-                    success_message = f"🎉 Successfully found {len(matched_df)} matches!"
+                    success_message = f"🎉 Successfully found {len(matches)} matches!"
                 else:
                     success_message = "🔍 No matches found."
                     additional_info.extend([
@@ -255,16 +1051,33 @@ def run_trial_matcher_with_data(patient_data):
                         "- Verify gene symbols match clinical trial descriptions"
                     ])
                 
-                display_results_with_download(
-                    matched_df,
-                    success_message,
-                    f"clinical_trial_matches_{date.today()}.csv",
-                    additional_info
-                )
+                # Kept in the session as compact pairs, so paging reruns do not repeat the match
+                st.session_state[TRIAL_RESULTS_KEY] = {
+                    'patient_data': patient_data,
+                    'matches': matches,
+                    'success_message': success_message,
+                    'additional_info': additional_info,
+                    'filename': f"clinical_trial_matches_{date.today()}.csv"
+                }
                     
             except Exception as e:
                 st.error(f"❌ Error processing trial matching: {str(e)}")
                 st.exception(e)
+    
+    # Show the last results while they still belong to the current patient data
+    stored_results = st.session_state.get(TRIAL_RESULTS_KEY)
+    if stored_results is not None:
+        if stored_results['patient_data'].equals(patient_data):
+            display_paged_results_with_download(
+                stored_results['matches'],
+                stored_results['success_message'],
+                stored_results['filename'],
+                stored_results['additional_info'],
+                key="trial_results"
+            )
+        else:
+            st.session_state.pop(TRIAL_RESULTS_KEY, None)
+
 
 # Keep the old function for backward compatibility
 def run_trial_matcher():
@@ -5,7 +5,7 @@ import time
 from datetime import date
 from ui.components import (
     display_file_uploader_with_preview, display_results_with_download,
-    create_loading_context, update_progress, simulate_progress_with_delay
+    create_loading_context, update_progress
 )
 from utils.enhanced_data_utils import (
     clean_column, load_patient_data, load_backend_gene_disease_database,
@@ -47,13 +47,10 @@ def process_rare_disease_matching(patients_df):
         return pd.DataFrame()
     
     # Progress tracking
-    progress_total = len(patients_df)
     progress_bar = st.progress(0, text="Processing rare disease matches...")
     
     matches = find_rare_disease_matches(patients_df, gene_disease_df, orphan_df)
-    
-    # Simulate progress for better UX
-    simulate_progress_with_delay(progress_bar, progress_total, "Matching drugs")
+    progress_bar.progress(1.0, text="Matching drugs complete")
     
     return matches
 
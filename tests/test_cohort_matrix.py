@@ -0,0 +1,39 @@
+import warnings
+
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+
+from utils.cohort_matrix import (
+    build_gene_trial_matrix, build_patient_gene_matrix, get_match_pairs, match_cohort_matrix
+)
+
+def build_cohort():
+    """Patient 0 has genes 0 and 1, patient 1 has gene 1; four trials"""
+    patient_gene = build_patient_gene_matrix(np.array([0, 0, 1]), np.array([0, 1, 1]), 2, 2)
+    gene_trial = build_gene_trial_matrix([np.array([0, 1, 3]), np.array([1, 2, 3])], 4)
+    return patient_gene, gene_trial
+
+def test_match_counts_stay_integers_with_exclusion_filter():
+    patient_gene, gene_trial = build_cohort()
+    trial_keep = np.array([True, True, False, True])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', FutureWarning)
+        matches = match_cohort_matrix(patient_gene, gene_trial, trial_keep)
+
+    patient_positions, trial_positions, gene_counts = get_match_pairs(matches)
+    assert np.issubdtype(gene_counts.dtype, np.integer)
+    assert patient_positions.tolist() == [0, 0, 0, 1, 1]
+    assert trial_positions.tolist() == [0, 1, 3, 1, 3]
+    assert gene_counts.tolist() == [1, 2, 2, 1, 1]
+
+def test_filtered_and_unfiltered_counts_share_dtype():
+    patient_gene, gene_trial = build_cohort()
+
+    unfiltered = match_cohort_matrix(patient_gene, gene_trial)
+    filtered = match_cohort_matrix(patient_gene, gene_trial, np.ones(4, dtype=bool))
+
+    assert filtered.dtype == unfiltered.dtype
+    assert (filtered != unfiltered).nnz == 0
@@ -1,6 +1,12 @@
 import streamlit as st
+import pandas as pd
 import time
 
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:
+    get_script_run_ctx = None
+
 def create_header():
     """Create dynamic animated header"""
     st.markdown("""
@@ -157,12 +163,198 @@ def display_results_with_download(results_df, success_message, filename, additio
         st.warning("🔍 No matches found.")
         st.info("💡 **Suggestions:**\n- Check your input data format\n- Verify gene names or patient IDs\n- Try adjusting exclusion filters")
 
+def display_paged_results_with_download(results, success_message, filename, additional_info=None,
+                                        page_size=100, key="results"):
+    """Display a lazily materialized match result one page at a time, with a CSV download
+    
+    ``results`` is a ``TrialMatchResult``: only the visible page is built
+    into rows, and the CSV is generated when the download is clicked.
+    """
+    if len(results) > 0:
+        create_stats_display({
+            "Total Matches": len(results),
+            "Unique Patients": results.count_unique_patients(),
+            "Unique Trials": results.count_unique_trials()
+        })
+        st.success(success_message)
+        
+        # Display additional information if provided
+        if additional_info:
+            for info in additional_info:
+                st.info(info)
+        
+        # Show one page of the results table
+        st.markdown("### 📊 Results")
+        page_count = -(-len(results) // page_size)
+        page = 1
+        if page_count > 1:
+            page = int(st.number_input(
+                f"Results page (of {page_count:,}):",
+                min_value=1,
+                max_value=page_count,
+                value=1,
+                step=1,
+                key=f"{key}_page"
+            ))
+        start = (page - 1) * page_size
+        stop = min(start + page_size, len(results))
+        st.caption(f"Rows {start + 1:,}-{stop:,} of {len(results):,}")
+        st.dataframe(results.materialize(start, stop), use_container_width=True, height=400)
+        
+        # The CSV is only built when the download is clicked
+        st.download_button(
+            "💾 **Download Results**",
+            results.to_csv,
+            file_name=filename,
+            mime="text/csv",
+            use_container_width=True,
+            key=f"{key}_download"
+        )
+    else:
+        st.warning("🔍 No matches found.")
+        st.info("💡 **Suggestions:**\n- Check your input data format\n- Verify gene names or patient IDs\n- Try adjusting exclusion filters")
+
 def create_loading_context(message="Processing..."):
     """Create loading context manager"""
     return st.spinner(f"🔄 {message}")
 
-def simulate_progress_with_delay(progress_bar, total_steps, base_message, delay=0.01):
-    """Simulate progress with visual delay for better UX"""
-    for i in range(total_steps):
-        update_progress(progress_bar, i + 1, total_steps, base_message)
-        time.sleep(delay)
+def is_headless():
+    """Check whether code is running outside a Streamlit script run (batch jobs, worker threads)"""
+    if get_script_run_ctx is None:
+        return True
+    return get_script_run_ctx(suppress_warning=True) is None
+
+def format_duration(seconds):
+    """Format a duration in seconds as a short human-readable string"""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
+
+class ProgressReporter:
+    """Progress bar driven by real work units, throttled by time
+    
+    Engines call ``advance`` as units of work complete; the bar is redrawn at
+    most ``max_updates_per_second`` times (each redraw is a websocket
+    round-trip) with an ETA from the elapsed rate. Outside a Streamlit
+    script run every call is a no-op.
+    """
+    
+    def __init__(self, total=0, message="Processing...", max_updates_per_second=10):
+        self.total = total
+        self.message = message
+        self.done = 0
+        self.min_interval = 1.0 / max_updates_per_second
+        self.started = time.perf_counter()
+        self.last_render = None
+        self.progress_bar = None if is_headless() else st.progress(0, text=message)
+    
+    def set_total(self, total, message=None):
+        """Set the number of work units once the engine knows it"""
+        self.total = total
+        if message is not None:
+            self.message = message
+        self._render(force=True)
+    
+    def advance(self, units=1, message=None):
+        """Record completed work units, redrawing the bar if the throttle allows"""
+        self.done += units
+        if message is not None:
+            self.message = message
+        self._render(force=self.total and self.done >= self.total)
+    
+    def finish(self, message=None):
+        """Mark all work as complete"""
+        self.done = max(self.done, self.total)
+        if message is not None:
+            self.message = message
+        self._render(force=True)
+    
+    def eta_seconds(self):
+        """Estimate the seconds remaining from the rate so far, or None if unknown"""
+        if not self.done or not self.total or self.done >= self.total:
+            return None
+        elapsed = time.perf_counter() - self.started
+        return elapsed / self.done * (self.total - self.done)
+    
+    def _render(self, force=False):
+        """Redraw the progress bar unless it was redrawn too recently"""
+        if self.progress_bar is None:
+            return
+        now = time.perf_counter()
+        if not force and self.last_render is not None and now - self.last_render < self.min_interval:
+            return
+        self.last_render = now
+        
+        if not self.total:
+            self.progress_bar.progress(0, text=self.message)
+            return
+        text = f"{self.message} {min(self.done, self.total)}/{self.total}"
+        eta = self.eta_seconds()
+        if eta is not None:
+            text += f" • ETA {format_duration(eta)}"
+        self.progress_bar.progress(min(self.done / self.total, 1.0), text=text)
+
+class LiveResultsTable:
+    """Results table and running statistics that fill in while a matcher streams chunks
+    
+    Chunks are appended as they arrive; the preview keeps only the first
+    ``max_rows`` rows, and redraws are throttled like ``ProgressReporter``.
+    Outside a Streamlit script run every call is a no-op.
+    """
+    
+    def __init__(self, title="Live results", max_rows=500, max_updates_per_second=4):
+        self.title = title
+        self.max_rows = max_rows
+        self.min_interval = 1.0 / max_updates_per_second
+        self.preview = []
+        self.preview_rows = 0
+        self.stats = {}
+        self.last_render = None
+        if is_headless():
+            self.stats_slot = self.table_slot = None
+        else:
+            self.stats_slot = st.empty()
+            self.table_slot = st.empty()
+    
+    @property
+    def rows_wanted(self):
+        """Rows the preview still has room for - none when nothing is drawn"""
+        return 0 if self.table_slot is None else self.max_rows - self.preview_rows
+    
+    def append(self, chunk_df, stats):
+        """Add a chunk of result rows and the latest running statistics"""
+        if chunk_df is not None and len(chunk_df) > 0 and self.preview_rows < self.max_rows:
+            chunk_df = chunk_df.head(self.max_rows - self.preview_rows)
+            self.preview.append(chunk_df)
+            self.preview_rows += len(chunk_df)
+        self.stats = stats
+        self._render()
+    
+    def finish(self, keep_table=False):
+        """Draw the final statistics, clearing the preview table unless asked to keep it"""
+        self._render(force=True)
+        if self.table_slot is not None and not keep_table:
+            self.table_slot.empty()
+    
+    def _render(self, force=False):
+        """Redraw the statistics and preview unless they were redrawn too recently"""
+        if self.stats_slot is None:
+            return
+        now = time.perf_counter()
+        if not force and self.last_render is not None and now - self.last_render < self.min_interval:
+            return
+        self.last_render = now
+        
+        stats_text = " • ".join(f"{label}: {value}" for label, value in self.stats.items())
+        self.stats_slot.markdown(f"**{self.title}** — {stats_text}")
+        if self.preview:
+            caption = f"First {self.preview_rows:,} rows" if self.preview_rows >= self.max_rows else None
+            with self.table_slot.container():
+                st.dataframe(pd.concat(self.preview), use_container_width=True, height=300)
+                if caption:
+                    st.caption(caption)
@@ -0,0 +1,54 @@
+import numpy as np
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+def is_sparse_available():
+    """Check whether scipy is installed for sparse cohort matching"""
+    return sparse is not None
+
+def build_patient_gene_matrix(patient_codes, gene_codes, n_patients, n_genes):
+    """Encode a long-format cohort as a binary patient x gene incidence matrix"""
+    matrix = sparse.csr_matrix(
+        (np.ones(len(patient_codes), dtype=np.int32), (patient_codes, gene_codes)),
+        shape=(n_patients, n_genes)
+    )
+    # A gene listed twice for one patient still counts once
+    matrix.data[:] = 1
+    return matrix
+
+def build_gene_trial_matrix(gene_positions, n_trials):
+    """Encode each gene's sorted matching trial positions as one row of a binary gene x trial matrix"""
+    indptr = np.zeros(len(gene_positions) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(positions) for positions in gene_positions])
+    indices = np.concatenate(gene_positions) if gene_positions else np.empty(0, dtype=np.int64)
+    return sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), indices, indptr),
+        shape=(len(gene_positions), n_trials)
+    )
+
+def match_cohort_matrix(patient_gene, gene_trial, trial_keep=None):
+    """Match a whole cohort as one sparse product
+
+    Returns the patient x trial matrix whose entries count how many of a
+    patient's genes match each trial. ``trial_keep`` is a boolean mask over
+    trials; excluded trials are dropped as matrix columns before the product.
+    """
+    if trial_keep is not None:
+        # Keep the diagonal in the counts' integer dtype - scipy would otherwise upcast to float64
+        gene_trial = gene_trial @ sparse.diags(trial_keep.astype(gene_trial.dtype), dtype=gene_trial.dtype)
+    matches = (patient_gene @ gene_trial).tocsr()
+    matches.eliminate_zeros()
+    matches.sort_indices()
+    return matches
+
+def get_match_pairs(matches):
+    """Turn a patient x trial match matrix into (patient, trial, gene count) arrays, in row order"""
+    patient_positions = np.repeat(np.arange(matches.shape[0]), np.diff(matches.indptr))
+    return patient_positions, matches.indices.astype(np.int64), matches.data
+
+def get_match_counts(matches):
+    """Count the matched trials of every patient - the row sums of the binarized match matrix"""
+    return np.diff(matches.indptr)
@@ -0,0 +1,415 @@
+import codecs
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_NAME = '.trader_cache'
+CACHE_SUFFIX = '.arrow'
+CONTENT_MANIFEST_SUFFIX = '.json'
+STORE_SUFFIX = '.sqlite'
+MANIFEST_SUFFIX = '.manifest.json'
+LOCK_SUFFIX = '.publish.lock'
+CACHE_FORMAT_VERSION = 3
+HASH_CHUNK_SIZE = 1024 * 1024
+SAMPLE_SIZE = 64 * 1024
+SUPPORTED_ENCODINGS = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+CANDIDATE_DELIMITERS = [',', '\t', ';', '|']
+
+# Versions of each table whose cache is kept besides the current one, so a revert is still a cache hit
+CACHE_KEEP_VERSIONS = 3
+# Cached content not in the catalog yet may belong to a load still in progress in another process
+CACHE_PRUNE_GRACE_SECONDS = 3600
+# Cached tables are keyed by source hash and conversions, trial stores by source hash alone
+CONTENT_KEY_PATTERN = re.compile(r'([0-9a-f]{64})(-[0-9a-f]{8})?')
+
+def get_cache_dir(source_path):
+    """Return the content-addressed cache directory beside a source file"""
+    return Path(source_path).parent / CACHE_DIR_NAME
+
+def get_content_key(sha256, schema=None, date_format=None):
+    """Key a cached table by source content and the conversions applied to it"""
+    conversions = json.dumps({'schema': schema or {}, 'date_format': date_format}, sort_keys=True)
+    return f"{sha256}-{hashlib.sha256(conversions.encode('utf-8')).hexdigest()[:8]}"
+
+def get_cache_path(source_path, content_key):
+    """Return the columnar cache path for a content key"""
+    return get_cache_dir(source_path) / (content_key + CACHE_SUFFIX)
+
+def get_content_manifest_path(source_path, content_key):
+    """Return the path of the manifest describing a cached content key"""
+    return get_cache_dir(source_path) / (content_key + CONTENT_MANIFEST_SUFFIX)
+
+def get_manifest_path(source_path):
+    """Return the sidecar manifest path stored next to a source file"""
+    source_path = Path(source_path)
+    return source_path.with_name(source_path.name + MANIFEST_SUFFIX)
+
+def compute_file_hash(file_path):
+    """Compute the SHA-256 content hash of a file in bounded chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_file_signature(file_path):
+    """Return the size and modification time used for fast cache validation"""
+    stat = Path(file_path).stat()
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+def read_json_file(path):
+    """Read a JSON file, or None if missing/corrupt"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_json_file(path, data):
+    """Atomically write a JSON file"""
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def read_manifest(source_path):
+    """Read the sidecar manifest for a source file, or None if missing/corrupt"""
+    return read_json_file(get_manifest_path(source_path))
+
+def write_manifest(source_path, manifest):
+    """Atomically write the sidecar manifest for a source file"""
+    write_json_file(get_manifest_path(source_path), manifest)
+
+def is_manifest_current(source_path, manifest):
+    """Check a manifest's recorded signature against the current source file
+
+    Size and mtime are compared first; when only the mtime differs the
+    content hash decides, so a touched-but-unchanged file keeps its manifest.
+    """
+    if not manifest or 'sha256' not in manifest:
+        return False
+
+    signature = get_file_signature(source_path)
+    if signature['size'] != manifest.get('size'):
+        return False
+    if signature['mtime'] == manifest.get('mtime'):
+        return True
+
+    if compute_file_hash(source_path) != manifest.get('sha256'):
+        return False
+
+    # Same content under a new mtime - refresh the manifest so the next check is cheap
+    manifest['mtime'] = signature['mtime']
+    try:
+        write_manifest(source_path, manifest)
+    except OSError as e:
+        logger.warning("Could not update manifest for %s: %s", source_path, e)
+    return True
+
+def detect_encoding(sample, truncated=False):
+    """Pick the encoding for a byte sample, preferring UTF-8
+
+    A truncated sample may end inside a multi-byte character, so the UTF-8
+    check uses an incremental decoder that tolerates an incomplete tail.
+    latin-1 maps every byte, so it is the final answer when UTF-8 fails.
+    """
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=not truncated)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+def detect_delimiter(header_line, default_sep):
+    """Pick the field delimiter from a header line, keeping the default when present"""
+    if default_sep in header_line:
+        return default_sep
+    counts = {sep: header_line.count(sep) for sep in CANDIDATE_DELIMITERS}
+    best_sep = max(counts, key=counts.get)
+    return best_sep if counts[best_sep] > 0 else default_sep
+
+def sniff_source_format(source_path, default_sep=','):
+    """Detect encoding and delimiter from a bounded byte sample of the file"""
+    with open(source_path, 'rb') as f:
+        sample = f.read(SAMPLE_SIZE + 1)
+    truncated = len(sample) > SAMPLE_SIZE
+    sample = sample[:SAMPLE_SIZE]
+
+    encoding = detect_encoding(sample, truncated)
+    header_line = sample.decode(encoding, errors='replace').splitlines()[0] if sample else ''
+    return encoding, detect_delimiter(header_line, default_sep)
+
+def _parse_source(source_path, encoding, sep):
+    """Parse a source file, falling back past an encoding the sample misjudged"""
+    encodings = [encoding] + [enc for enc in SUPPORTED_ENCODINGS if enc != encoding]
+    for candidate in encodings:
+        try:
+            return pd.read_csv(source_path, sep=sep, encoding=candidate), candidate
+        except UnicodeDecodeError:
+            # The byte sample looked clean but a later part of the file did not
+            continue
+    return None, None
+
+def apply_schema(df, schema, date_format=None):
+    """Convert columns to their declared storage types
+
+    ``schema`` maps column names to ``'category'`` (dictionary-encoded),
+    ``'string'`` (Arrow-backed) or ``'date'``. Columns missing from the file
+    are ignored so a schema never turns a loadable file into an error.
+    """
+    if not schema:
+        return df
+
+    df = df.copy()
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        if kind == 'category':
+            df[col] = df[col].astype('category')
+        elif kind == 'string':
+            df[col] = df[col].astype(pd.StringDtype('pyarrow') if pa is not None else 'string')
+        elif kind == 'date':
+            df[col] = pd.to_datetime(df[col], format=date_format, errors='coerce')
+        else:
+            raise ValueError(f"Unsupported column type in schema: {kind}")
+    return df
+
+def build_manifest(signature, df, encoding, sep):
+    """Describe a parsed source file so later loads need not parse it"""
+    manifest = dict(signature)
+    manifest.update({
+        'encoding': encoding,
+        'delimiter': sep,
+        'row_count': int(len(df)),
+        'columns': [{'name': str(col), 'dtype': str(dtype)} for col, dtype in df.dtypes.items()]
+    })
+    return manifest
+
+def write_cached_table(source_path, content_key, df):
+    """Write a DataFrame to the content-addressed columnar cache
+
+    The file is written uncompressed so readers can memory-map it and build
+    pandas views directly over the mapped pages.
+    """
+    cache_path = get_cache_path(source_path, content_key)
+    cache_path.parent.mkdir(exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+
+    try:
+        feather.write_feather(df.reset_index(drop=True), tmp_path, compression='uncompressed')
+        # Readers that already mapped the old file keep their pages until they let go
+        os.replace(tmp_path, cache_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def _arrow_types_mapper(arrow_type):
+    """Keep string columns Arrow-backed so pandas wraps the mapped buffers instead of copying"""
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype('pyarrow')
+    return None
+
+def read_mapped_table(cache_path):
+    """Memory-map a cached table read-only and wrap it in zero-copy pandas views"""
+    table = feather.read_table(cache_path, memory_map=True)
+    return table.to_pandas(split_blocks=True, types_mapper=_arrow_types_mapper)
+
+def prune_cache_dir(cache_dir, keep_hashes, known_hashes=(), grace_seconds=CACHE_PRUNE_GRACE_SECONDS):
+    """Delete cached tables, content manifests and trial stores whose source hash is not kept, returning the bytes freed
+
+    Content of a ``known_hashes`` version (one the catalog has recorded) is
+    deleted right away; content of an unknown hash only once it is older
+    than ``grace_seconds``. Processes that already mapped a deleted file
+    keep their pages until they let go.
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.is_dir():
+        return 0
+
+    now = time.time()
+    freed = 0
+    for path in cache_dir.iterdir():
+        if path.suffix not in (CACHE_SUFFIX, CONTENT_MANIFEST_SUFFIX, STORE_SUFFIX):
+            continue
+        match = CONTENT_KEY_PATTERN.fullmatch(path.stem)
+        if match is None or match.group(1) in keep_hashes:
+            continue
+        try:
+            stat = path.stat()
+            if match.group(1) not in known_hashes and now - stat.st_mtime < grace_seconds:
+                continue
+            path.unlink()
+            freed += stat.st_size
+        except OSError as e:
+            logger.warning("Could not prune cached file %s: %s", path, e)
+    return freed
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive cross-process lock beside ``path`` for the duration of the block"""
+    if fcntl is None:
+        # Atomic renames still keep concurrent writers safe, just not deduplicated
+        yield
+        return
+
+    path = Path(path)
+    lock_path = path.with_name(path.name + LOCK_SUFFIX)
+    try:
+        lock_file = open(lock_path, 'a')
+    except OSError:
+        yield
+        return
+
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_table_info(source_path):
+    """Return the current manifest (encoding, delimiter, row count, schema) or None"""
+    manifest = read_manifest(source_path)
+    return manifest if is_manifest_current(source_path, manifest) else None
+
+def _read_published_table(source_path, schema, date_format):
+    """Map the published cache if it is current, returning ``(df or None, manifest)``"""
+    manifest = get_table_info(source_path)
+    if manifest is None or feather is None:
+        return None, manifest
+
+    content_key = get_content_key(manifest['sha256'], schema, date_format)
+    cache_path = get_cache_path(source_path, content_key)
+    if (manifest.get('content_key') != content_key or not cache_path.exists()
+            or manifest.get('cache_format') != CACHE_FORMAT_VERSION):
+        return None, manifest
+
+    try:
+        return read_mapped_table(cache_path), manifest
+    except Exception as e:
+        logger.warning("Discarding unreadable cache for %s: %s", source_path, e)
+        return None, manifest
+
+def _publish_manifest(source_path, manifest):
+    """Write a source manifest, tolerating a read-only directory"""
+    try:
+        write_manifest(source_path, manifest)
+    except OSError as e:
+        logger.warning("Could not write manifest for %s: %s", source_path, e)
+
+def _adopt_cached_content(source_path, signature, content_key):
+    """Point a source file at content that is already cached, or return None
+
+    The same bytes re-dropped under another name (or a file reverted to an
+    earlier version) hash to a known content key, so the parse is skipped.
+    """
+    content_manifest = read_json_file(get_content_manifest_path(source_path, content_key))
+    cache_path = get_cache_path(source_path, content_key)
+    if (feather is None or content_manifest is None or not cache_path.exists()
+            or content_manifest.get('cache_format') != CACHE_FORMAT_VERSION):
+        return None
+
+    try:
+        df = read_mapped_table(cache_path)
+    except Exception as e:
+        logger.warning("Discarding unreadable cache for %s: %s", source_path, e)
+        return None
+
+    manifest = dict(content_manifest)
+    manifest.update(signature)
+    _publish_manifest(source_path, manifest)
+    return df, manifest
+
+def _build_table(source_path, default_sep, manifest, schema, date_format):
+    """Parse a source file and publish its cache and manifest, returning ``(df, manifest, parsed)``"""
+    # The signature is taken before parsing so a file that changes mid-parse
+    # is never recorded as matching the parsed content
+    signature = get_file_signature(source_path)
+    signature['sha256'] = compute_file_hash(source_path)
+    content_key = get_content_key(signature['sha256'], schema, date_format)
+
+    adopted = _adopt_cached_content(source_path, signature, content_key)
+    if adopted is not None:
+        return adopted + (False,)
+
+    if manifest is not None:
+        encoding, sep = manifest['encoding'], manifest['delimiter']
+    else:
+        encoding, sep = sniff_source_format(source_path, default_sep)
+
+    df, encoding = _parse_source(source_path, encoding, sep)
+    if df is None:
+        return None, None, True
+
+    df = apply_schema(df, schema, date_format)
+    manifest = build_manifest(signature, df, encoding, sep)
+    manifest['declared_schema'] = schema or {}
+    manifest['content_key'] = content_key
+    if feather is not None:
+        try:
+            write_cached_table(source_path, content_key, df)
+            manifest['cache_format'] = CACHE_FORMAT_VERSION
+            content_manifest = {k: v for k, v in manifest.items() if k not in ('size', 'mtime')}
+            write_json_file(get_content_manifest_path(source_path, content_key), content_manifest)
+        except Exception as e:
+            # Caching is an optimization only - mixed-type columns or a read-only
+            # directory must never prevent the database from loading
+            logger.warning("Could not write cache for %s: %s", source_path, e)
+    _publish_manifest(source_path, manifest)
+
+    return df, manifest, True
+
+def load_backend_table(source_path, default_sep=',', schema=None, date_format=None):
+    """Load a backend table from its memory-mapped cache, rebuilding it when the source changed
+
+    Every worker process maps the same published Arrow file read-only, so the
+    table's pages live once in the OS page cache instead of once per process.
+    Caches are addressed by the source's content hash, so a file whose bytes
+    were seen before is never parsed again, whatever its name. ``schema`` and
+    ``date_format`` are applied before the cache is written, so categorical
+    and date columns are stored already converted. Returns
+    ``(df, manifest, from_cache)``; ``df`` is None when the file could not be
+    decoded with any supported encoding.
+    """
+    source_path = Path(source_path)
+
+    df, manifest = _read_published_table(source_path, schema, date_format)
+    if df is not None:
+        return df, manifest, True
+
+    with file_lock(source_path):
+        # Another worker process may have published the table while we waited
+        df, manifest = _read_published_table(source_path, schema, date_format)
+        if df is not None:
+            return df, manifest, True
+        df, manifest, parsed = _build_table(source_path, default_sep, manifest, schema, date_format)
+
+    if df is None:
+        return None, None, False
+    if not parsed:
+        return df, manifest, True
+
+    # Drop the privately parsed copy in favour of a view over the shared file
+    mapped_df, _ = _read_published_table(source_path, schema, date_format)
+    return (mapped_df if mapped_df is not None else df), manifest, False
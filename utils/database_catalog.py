@@ -0,0 +1,88 @@
+import datetime
+import logging
+import threading
+from pathlib import Path
+
+from utils.database_cache import file_lock, read_json_file, write_json_file
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILENAME = 'catalog.json'
+VERSION_LENGTH = 12
+
+def format_version(sha256):
+    """Turn a content hash into the short version identifier shown to users"""
+    return sha256[:VERSION_LENGTH]
+
+class DatabaseCatalog:
+    """Local record of every version of every backend table ever loaded
+
+    A version is the SHA-256 of the source file's bytes, so two files with
+    identical content are the same version whatever their names or mtimes,
+    and a version can be cited in an audit trail and recognized again later.
+    """
+
+    def __init__(self, catalog_path):
+        self.catalog_path = Path(catalog_path)
+        self._lock = threading.Lock()
+
+    def _read(self):
+        """Read the catalog file, or an empty catalog if missing/corrupt"""
+        catalog = read_json_file(self.catalog_path)
+        return catalog if isinstance(catalog, dict) else {'versions': {}}
+
+    def register(self, db_name, source_path, manifest):
+        """Record that a table was loaded from the given content and return its version record"""
+        sha256 = manifest['sha256']
+        now = datetime.datetime.now().isoformat(timespec='seconds')
+        source_date = datetime.datetime.fromtimestamp(manifest['mtime']).isoformat(timespec='seconds')
+
+        with self._lock:
+            try:
+                self.catalog_path.parent.mkdir(exist_ok=True)
+                with file_lock(self.catalog_path):
+                    catalog = self._read()
+                    record = catalog['versions'].get(sha256)
+                    if record is None:
+                        record = {
+                            'version': format_version(sha256),
+                            'sha256': sha256,
+                            'db_name': db_name,
+                            'first_seen': now,
+                            'source_date': source_date,
+                            'row_count': manifest.get('row_count'),
+                            'files': []
+                        }
+                    record['last_loaded'] = now
+                    file_name = Path(source_path).name
+                    if file_name not in record['files']:
+                        record['files'].append(file_name)
+                    catalog['versions'][sha256] = record
+                    write_json_file(self.catalog_path, catalog)
+            except OSError as e:
+                # The catalog is bookkeeping only - a read-only directory must not block loading
+                logger.warning("Could not update database catalog: %s", e)
+                record = self.get_record(sha256) or {
+                    'version': format_version(sha256), 'sha256': sha256, 'db_name': db_name,
+                    'first_seen': now, 'source_date': source_date,
+                    'row_count': manifest.get('row_count'), 'files': [Path(source_path).name]
+                }
+        return record
+
+    def get_record(self, sha256):
+        """Get the version record for a content hash, or None if never seen"""
+        return self._read()['versions'].get(sha256)
+
+    def get_retained_hashes(self, keep_versions):
+        """Get the content hashes of each table's most recently loaded versions, and every recorded hash
+
+        Returns ``(retained, known)``: the ``keep_versions`` latest versions
+        per table by last load, and all versions the catalog has seen.
+        """
+        versions = self._read()['versions']
+        retained = set()
+        for db_name in {record['db_name'] for record in versions.values()}:
+            records = [record for record in versions.values() if record['db_name'] == db_name]
+            records.sort(key=lambda record: record.get('last_loaded', record['first_seen']), reverse=True)
+            retained.update(record['sha256'] for record in records[:keep_versions])
+        return retained, set(versions)
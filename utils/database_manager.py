@@ -1,136 +1,553 @@
+import datetime
+import threading
 import pandas as pd
 import streamlit as st
 from pathlib import Path
 import logging
 
-class DatabaseManager:
-    """Centralized database management for TRADER application"""
-    
-    def __init__(self):
-        self.base_path = Path(__file__).parent.parent
-        self.databases = {}
-        self.status = {}
-        
-    def load_all_databases(self):
-        """Load all required databases with comprehensive error handling"""
-        file_configs = {
-            'clinical_trials': {
-                'file': 'matched_clinical_trials_20240716_cleaned.test.csv',
-                'type': 'csv',
-                'description': 'Clinical Trials Database'
-            },
-            'gene_disease': {
-                'file': 'gene_disease.test.txt',
-                'type': 'tsv',
-                'description': 'Gene-Disease Associations'
-            },
-            'orphan_drugs': {
-                'file': 'orphan_drugs.test.txt',
-                'type': 'tsv',
-                'description': 'FDA Orphan Drug Designations'
-            },
-            'rare_disease_matches': {
-                'file': 'rare_disease_matches_20240716_cleaned.test.csv',
-                'type': 'csv',
-                'description': 'Rare Disease Matches'
-            }
-        }
-        
-        for db_name, config in file_configs.items():
-            self._load_single_database(db_name, config)
-            
-        return self.databases, self.status
-    
-    def _load_single_database(self, db_name, config):
-        """Load a single database file with proper error handling"""
-        file_path = self.base_path / config['file']
-        
+from utils.database_cache import (
+    CACHE_DIR_NAME, CACHE_KEEP_VERSIONS, get_file_signature, get_table_info, load_backend_table, prune_cache_dir,
+    read_manifest
+)
+from utils.database_catalog import CATALOG_FILENAME, DatabaseCatalog
+
+logger = logging.getLogger(__name__)
+
+# Failed-signature key of the SQLite trial store, next to the table names
+TRIAL_STORE_KEY = 'trial_store'
+
+# Every backend table the application reads, keyed by its repository name
+BACKEND_TABLES = {
+    'clinical_trials': {
+        'file': 'matched_clinical_trials_20240716_cleaned.csv',
+        'sep': ',',
+        'description': 'Clinical Trials Database',
+        'required_columns': ['StudyTitle', 'BriefSummary'],
+        'schema': {'StudyTitle': 'string', 'BriefSummary': 'string'}
+    },
+    'gene_disease': {
+        'file': 'gene_disease.txt',
+        'sep': '\t',
+        'description': 'Gene-Disease Associations',
+        'required_columns': ['Name', 'Symbol'],
+        'schema': {'Name': 'string', 'Symbol': 'category'}
+    },
+    'orphan_drugs': {
+        'file': 'orphan_drugs.txt',
+        'sep': '\t',
+        'description': 'FDA Orphan Drug Designations',
+        'required_columns': ['GenericName', 'TradeName', 'DateDesignated', 'OrphanDesignation'],
+        'schema': {
+            'GenericName': 'string',
+            'TradeName': 'string',
+            'DateDesignated': 'date',
+            'OrphanDesignation': 'string',
+            'OrphanDesignationStatus': 'category',
+            'FDAOrphanApprovalStatus': 'category',
+            'SponsorCompany': 'category'
+        },
+        'date_format': '%m/%d/%Y'
+    },
+    'rare_disease_matches': {
+        'file': 'rare_disease_matches_20240716_cleaned.csv',
+        'sep': ',',
+        'description': 'REACTOR Database',
+        'required_columns': ['PatientID'],
+        'schema': {'PatientID': 'string', 'Gene': 'category'}
+    }
+}
+
+# Seconds between file watcher polls of the backend source files
+WATCH_INTERVAL_SECONDS = 5.0
+
+class TableSnapshot:
+    """One loaded version of a backend table together with its derived structures
+
+    Snapshots are never mutated after they are published, apart from lazily
+    adding derived structures, so a session that grabbed one keeps a
+    consistent view even while a newer version is swapped in.
+    """
+
+    def __init__(self, db_name, df, manifest, status, file_date, signature, version_record=None):
+        self.db_name = db_name
+        self.df = df
+        self.manifest = manifest
+        self.status = status
+        self.file_date = file_date
+        self.signature = signature
+        self.version_record = version_record
+        self.loaded_at = datetime.datetime.now()
+        self._derived = {}
+        self._builders = {}
+        self._derived_lock = threading.Lock()
+
+    @property
+    def version(self):
+        """Get the content version of this snapshot's table, or None if it did not load"""
+        return self.version_record['version'] if self.version_record else None
+
+    def get_derived(self, key, builder):
+        """Get a structure derived from this snapshot's table, building it once on first use"""
+        if key in self._derived:
+            return self._derived[key]
+
+        with self._derived_lock:
+            if key not in self._derived:
+                self._derived[key] = builder(self.df)
+                self._builders[key] = builder
+        return self._derived[key]
+
+    def project(self, columns):
+        """Get a view of just the given columns for hot matching loops
+
+        With the memory-mapped cache, pages of the columns left out are never
+        touched by the matching loop.
+        """
+        columns = tuple(columns)
+        return self.get_derived(('columns', columns), lambda df: df[list(columns)])
+
+    def fetch_rows(self, row_ids, columns=None):
+        """Materialize full records for the given row IDs only, keeping the IDs as the index"""
+        df = self.df if columns is None else self.df[list(columns)]
+        return df.take(list(row_ids))
+
+    def rebuild_derived_from(self, other):
+        """Build every derived structure another snapshot had, so a swap costs readers nothing
+
+        Derived structures depend only on the table's content, so a snapshot
+        of the same version takes them over as they are.
+        """
+        if self.version is not None and self.version == other.version:
+            with other._derived_lock:
+                self._derived.update(other._derived)
+                self._builders.update(other._builders)
+            return
+
+        for key, builder in list(other._builders.items()):
+            try:
+                self.get_derived(key, builder)
+            except Exception:
+                logger.exception("Failed to rebuild derived structure %s for %s", key, self.db_name)
+
+def _same_signature(signature, other):
+    """Check whether two file signatures describe the same file version"""
+    return other is not None and (signature['size'], signature['mtime']) == (other['size'], other['mtime'])
+
+class BackendRepository:
+    """Single owner of every backend table: loading, caching, validation and refresh
+
+    Each table is parsed at most once per process (and served from the
+    columnar cache on later cold starts). Loads are serialized per table so
+    concurrent sessions never parse the same file twice. Loaded tables are
+    held as immutable snapshots; reloads build a complete new snapshot in the
+    background and publish it with a single reference swap.
+    """
+
+    def __init__(self, base_path=None):
+        self.base_path = Path(base_path) if base_path else Path(__file__).parent.parent
+        self._snapshots = {}
+        self._states = {db_name: 'pending' for db_name in BACKEND_TABLES}
+        self._locks = {db_name: threading.Lock() for db_name in BACKEND_TABLES}
+        self._reload_lock = threading.Lock()
+        self._prefetch_thread = None
+        self._watcher_thread = None
+        self._stop_watching = threading.Event()
+        self._trial_store = None
+        self._trial_store_lock = threading.Lock()
+        # Signature of each source file version that failed to reload, so the watcher skips it until it changes
+        self._failed_signatures = {}
+        self.catalog = DatabaseCatalog(self.base_path / CACHE_DIR_NAME / CATALOG_FILENAME)
+
+    def get_file_path(self, db_name):
+        """Get the source file path for a backend table"""
+        return self.base_path / BACKEND_TABLES[db_name]['file']
+
+    def snapshot(self, db_name):
+        """Get the current snapshot of a backend table, loading it on first use"""
+        if db_name in self._snapshots:
+            return self._snapshots[db_name]
+
+        with self._locks[db_name]:
+            # Another session (or the prefetch thread) may have finished loading while we waited
+            if db_name not in self._snapshots:
+                self._states[db_name] = 'loading'
+                snapshot = self._build_snapshot(db_name)
+                self._snapshots[db_name] = snapshot
+                self._states[db_name] = 'ready' if snapshot.df is not None else 'error'
+        return self._snapshots[db_name]
+
+    def load(self, db_name):
+        """Load a backend table once and return it, or None if unavailable"""
+        return self.snapshot(db_name).df
+
+    def _build_snapshot(self, db_name):
+        """Load a single backend table with proper error handling"""
+        config = BACKEND_TABLES[db_name]
+        file_path = self.get_file_path(db_name)
+        df = None
+        manifest = None
+        signature = None
+        version_record = None
+        file_date = "N/A"
+
         try:
             if not file_path.exists():
-                self.status[db_name] = f"❌ File not found: {config['file']}"
-                self.databases[db_name] = None
-                return
-                
-            # Load based on file type
-            if config['type'] == 'csv':
-                df = pd.read_csv(file_path, encoding='utf-8')
-            elif config['type'] == 'tsv':
-                df = pd.read_csv(file_path, sep='\t', encoding='utf-8')
-            else:
-                raise ValueError(f"Unsupported file type: {config['type']}")
-            
-            # Validate DataFrame
-            if df.empty:
-                self.status[db_name] = f"⚠️ Empty file: {config['file']}"
+                return TableSnapshot(db_name, None, None, f"❌ File not found: {config['file']}", file_date, None)
+
+            # Taken before loading so a file replaced mid-load is picked up by the watcher
+            signature = get_file_signature(file_path)
+            file_date = datetime.datetime.fromtimestamp(signature['mtime']).strftime('%Y-%m-%d %H:%M')
+
+            df, manifest, from_cache = load_backend_table(
+                file_path, config['sep'], config.get('schema'), config.get('date_format')
+            )
+            if df is None:
+                status = "❌ Could not decode file with any encoding"
             else:
-                self.status[db_name] = f"✅ {config['description']}: {len(df)} records"
-                
-            self.databases[db_name] = df
-            
+                is_valid, message = self._validate_columns(db_name, df)
+                source = f"{manifest['encoding']}, cached" if from_cache else manifest['encoding']
+                if not is_valid:
+                    status = f"❌ {message}"
+                    df = None
+                elif df.empty:
+                    status = f"⚠️ Empty file: {config['file']}"
+                else:
+                    status = f"✅ Loaded {len(df)} records ({source})"
+                if df is not None:
+                    version_record = self.catalog.register(db_name, file_path, manifest)
+                    if not from_cache:
+                        # A new version was just cached - drop copies no table will load again
+                        self.prune_cache()
+
         except pd.errors.EmptyDataError:
-            self.status[db_name] = f"❌ Empty or invalid CSV: {config['file']}"
-            self.databases[db_name] = None
-        except UnicodeDecodeError:
-            # Try different encodings
+            status = f"❌ Empty or invalid file: {config['file']}"
+            df = None
+        except Exception as e:
+            logger.exception("Failed to load backend table %s", db_name)
+            status = f"❌ Unexpected error: {str(e)}"
+            file_date = "Error"
+            df = None
+
+        return TableSnapshot(db_name, df, manifest, status, file_date, signature, version_record)
+
+    def prune_cache(self, keep_versions=CACHE_KEEP_VERSIONS):
+        """Delete cached table copies that are neither current nor among each table's latest versions"""
+        try:
+            retained, known = self.catalog.get_retained_hashes(keep_versions)
+            for db_name in BACKEND_TABLES:
+                manifest = read_manifest(self.get_file_path(db_name))
+                if manifest and 'sha256' in manifest:
+                    retained.add(manifest['sha256'])
+            store = self._trial_store
+            if store is not None and store.source_sha256:
+                retained.add(store.source_sha256)
+            freed = prune_cache_dir(self.base_path / CACHE_DIR_NAME, retained, known)
+        except Exception:
+            # Pruning only saves disk space - it must never fail a load
+            logger.exception("Failed to prune the table cache")
+            return
+        if freed:
+            logger.info("Pruned %.1f MB of cached table versions", freed / 1024 / 1024)
+
+    def load_all(self):
+        """Load every backend table"""
+        for db_name in BACKEND_TABLES:
+            self.load(db_name)
+
+    def prefetch(self, db_names=None):
+        """Load the remaining tables on a background thread without blocking the caller"""
+        if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+            return
+
+        pending = [name for name in (db_names or BACKEND_TABLES) if name not in self._snapshots]
+        if not pending:
+            return
+
+        self._prefetch_thread = threading.Thread(
+            target=self._prefetch_worker, args=(pending,), name="trader-prefetch", daemon=True
+        )
+        self._prefetch_thread.start()
+
+    def _prefetch_worker(self, db_names):
+        """Background prefetch loop - must not touch any Streamlit API"""
+        for db_name in db_names:
             try:
-                if config['type'] == 'csv':
-                    df = pd.read_csv(file_path, encoding='latin-1')
-                else:
-                    df = pd.read_csv(file_path, sep='\t', encoding='latin-1')
-                self.databases[db_name] = df
-                self.status[db_name] = f"✅ {config['description']}: {len(df)} records (latin-1 encoding)"
-            except Exception as e:
-                self.status[db_name] = f"❌ Encoding error: {str(e)}"
-                self.databases[db_name] = None
+                self.load(db_name)
+            except Exception:
+                logger.exception("Background prefetch failed for %s", db_name)
+
+    def reload(self, db_name):
+        """Build a new snapshot of a table off to the side, then swap it in atomically
+
+        Readers keep using the previous snapshot until the swap, and keep any
+        reference they already hold afterwards. If the new version fails to
+        load, the previous snapshot stays published.
+        """
+        with self._reload_lock:
+            current = self._snapshots.get(db_name)
+            snapshot = self._build_snapshot(db_name)
+
+            if snapshot.df is None and current is not None and current.df is not None:
+                logger.warning("Keeping previous %s after failed reload: %s", db_name, snapshot.status)
+                if snapshot.signature is not None:
+                    self._failed_signatures[db_name] = snapshot.signature
+                return current
+
+            self._failed_signatures.pop(db_name, None)
+
+            if current is not None:
+                snapshot.rebuild_derived_from(current)
+
+            self._snapshots[db_name] = snapshot
+            self._states[db_name] = 'ready' if snapshot.df is not None else 'error'
+            logger.info("Published new version of %s", db_name)
+            return snapshot
+
+    def refresh(self, db_name=None):
+        """Reload tables from disk without ever leaving readers without a table"""
+        for name in ([db_name] if db_name else list(BACKEND_TABLES)):
+            if name in self._snapshots:
+                self.reload(name)
+
+    def find_changed_tables(self):
+        """Get the loaded tables whose source file changed since their snapshot was taken
+        
+        A file version that already failed to reload is skipped until its
+        size or modification time changes again.
+        """
+        changed = []
+        for db_name, snapshot in list(self._snapshots.items()):
+            file_path = self.get_file_path(db_name)
+            try:
+                signature = get_file_signature(file_path)
+            except OSError:
+                # A file being replaced may briefly be missing - keep serving the old snapshot
+                continue
+            if _same_signature(signature, self._failed_signatures.get(db_name)):
+                continue
+            if not _same_signature(signature, snapshot.signature):
+                changed.append(db_name)
+        return changed
+
+    def start_watcher(self, interval=WATCH_INTERVAL_SECONDS):
+        """Start the background file watcher that hot-reloads changed tables"""
+        if self._watcher_thread is not None and self._watcher_thread.is_alive():
+            return
+
+        self._stop_watching.clear()
+        self._watcher_thread = threading.Thread(
+            target=self._watch_loop, args=(interval,), name="trader-watcher", daemon=True
+        )
+        self._watcher_thread.start()
+
+    def stop_watcher(self):
+        """Stop the background file watcher"""
+        self._stop_watching.set()
+
+    def _watch_loop(self, interval):
+        """Poll source files and reload changed tables - must not touch any Streamlit API"""
+        while not self._stop_watching.wait(interval):
+            for db_name in self.find_changed_tables():
+                try:
+                    self.reload(db_name)
+                except Exception:
+                    logger.exception("Hot reload failed for %s", db_name)
+
+            if self._trial_store is not None:
+                try:
+                    with self._trial_store_lock:
+                        self._refresh_trial_store()
+                except Exception:
+                    logger.exception("Hot reload failed for the trial store")
+
+    def _swap_trial_store(self):
+        """Import a fresh trial store and publish it
+
+        Each version has its own store file, so stores opened earlier keep
+        reading their own version.
+        """
+        # Imported here because the store depends on enhanced_data_utils, which imports this module
+        from utils.trial_store import TrialStore
+
+        store = TrialStore(self.get_file_path('clinical_trials')).open()
+        self._trial_store = store
+        self._failed_signatures.pop(TRIAL_STORE_KEY, None)
+        self.prune_cache()
+        return store
+
+    def _refresh_trial_store(self):
+        """Swap in a fresh trial store if the source changed, keeping the current one if the import fails
+
+        A file version that already failed to import is skipped until its
+        size or modification time changes again. Callers hold the store lock.
+        """
+        if not self._trial_store.is_stale():
+            return
+
+        signature = get_file_signature(self.get_file_path('clinical_trials'))
+        if _same_signature(signature, self._failed_signatures.get(TRIAL_STORE_KEY)):
+            return
+        try:
+            self._swap_trial_store()
         except Exception as e:
-            self.status[db_name] = f"❌ Load error: {str(e)}"
-            self.databases[db_name] = None
-    
-    def get_database(self, db_name):
-        """Get a specific database with fallback"""
-        return self.databases.get(db_name)
-    
+            self._failed_signatures[TRIAL_STORE_KEY] = signature
+            logger.warning("Keeping previous trial store after failed import: %s", e)
+
+    def get_trial_store(self):
+        """Get the SQLite FTS5 store for the clinical trials table, importing it if needed"""
+        with self._trial_store_lock:
+            if self._trial_store is None:
+                self._swap_trial_store()
+            elif self._watcher_thread is None or not self._watcher_thread.is_alive():
+                # Without the watcher nobody else will notice a changed source file
+                self._refresh_trial_store()
+        return self._trial_store
+
+    def get_columns(self, db_name, columns):
+        """Get only the given columns of a backend table, or an empty DataFrame"""
+        snapshot = self.snapshot(db_name)
+        if snapshot.df is None:
+            return pd.DataFrame(columns=list(columns))
+        return snapshot.project(columns)
+
+    def get_table(self, db_name):
+        """Get a backend table, or an empty DataFrame if it could not be loaded"""
+        df = self.load(db_name)
+        return df if df is not None else pd.DataFrame()
+
+    def get_trials(self):
+        """Get the clinical trials table"""
+        return self.get_table('clinical_trials')
+
+    def get_gene_disease(self):
+        """Get the gene-disease association table"""
+        return self.get_table('gene_disease')
+
+    def get_orphan_drugs(self):
+        """Get the FDA orphan drug designation table"""
+        return self.get_table('orphan_drugs')
+
+    def get_reactor(self):
+        """Get the REACTOR historical matches table"""
+        return self.get_table('rare_disease_matches')
+
+    def is_loaded(self, db_name):
+        """Check whether a table has been loaded successfully"""
+        snapshot = self._snapshots.get(db_name)
+        return snapshot is not None and snapshot.df is not None
+
+    def row_count(self, db_name):
+        """Get a table's row count, from the manifest when the table is not loaded yet"""
+        if self.is_loaded(db_name):
+            return len(self._snapshots[db_name].df)
+
+        if not self.get_file_path(db_name).exists():
+            return 0
+        table_info = self.get_table_info(db_name)
+        if table_info is not None:
+            return table_info['row_count']
+        return len(self.get_table(db_name))
+
+    def check_available(self, db_name):
+        """Get a table's row count, raising if the table could not be loaded"""
+        count = self.row_count(db_name)
+        status = self.get_status(db_name)
+        if "❌" in status:
+            raise RuntimeError(status.replace("❌ ", ""))
+        return count
+
     def get_status(self, db_name):
-        """Get status for a specific database"""
-        return self.status.get(db_name, "Unknown status")
-    
-    def validate_gene_disease_format(self):
-        """Validate gene-disease data format"""
-        df = self.get_database('gene_disease')
-        if df is not None:
-            expected_columns = ['Name', 'Symbol']
-            if not all(col in df.columns for col in expected_columns):
-                return False, f"Missing columns. Expected: {expected_columns}, Found: {list(df.columns)}"
-            return True, "Valid format"
-        return False, "Database not loaded"
-    
-    def validate_orphan_drugs_format(self):
-        """Validate orphan drugs data format"""
-        df = self.get_database('orphan_drugs')
-        if df is not None:
-            expected_columns = ['GenericName', 'TradeName', 'DateDesignated', 'OrphanDesignation']
-            if not all(col in df.columns for col in expected_columns):
-                return False, f"Missing columns. Expected: {expected_columns}, Found: {list(df.columns)}"
-            return True, "Valid format"
-        return False, "Database not loaded"
-
-# Global database manager instance
+        """Get status for a specific table"""
+        snapshot = self._snapshots.get(db_name)
+        return snapshot.status if snapshot is not None else "Not loaded"
+
+    def get_state(self, db_name):
+        """Get the loading state of a table: pending, loading, ready or error"""
+        return self._states[db_name]
+
+    def get_file_date(self, db_name):
+        """Get the source file modification date for a specific table"""
+        snapshot = self._snapshots.get(db_name)
+        return snapshot.file_date if snapshot is not None else "Unknown"
+
+    def get_loaded_at(self, db_name):
+        """Get when the currently published version of a table was loaded, or None"""
+        snapshot = self._snapshots.get(db_name)
+        return snapshot.loaded_at if snapshot is not None else None
+
+    def get_version_info(self, db_name):
+        """Get the version record of a table's current content without loading it, or None"""
+        snapshot = self._snapshots.get(db_name)
+        if snapshot is not None and snapshot.version_record is not None:
+            return snapshot.version_record
+
+        table_info = self.get_table_info(db_name)
+        if table_info is None:
+            return None
+        return self.catalog.get_record(table_info['sha256'])
+
+    def get_version_summary(self, db_name):
+        """Get display strings for a table's content version and source file date"""
+        version_info = self.get_version_info(db_name)
+        if version_info is None:
+            return "Not loaded yet", "Unknown"
+        return version_info['version'], version_info['source_date'].replace('T', ' ')[:16]
+
+    def get_table_info(self, db_name):
+        """Get the current manifest for a table without loading it, or None"""
+        file_path = self.get_file_path(db_name)
+        if not file_path.exists():
+            return None
+        return get_table_info(file_path)
+
+    def get_memory_report(self, db_name):
+        """Get a per-column memory breakdown for a loaded table, or None"""
+        if not self.is_loaded(db_name):
+            return None
+
+        df = self._snapshots[db_name].df
+        usage = df.memory_usage(index=False, deep=True)
+        report = pd.DataFrame({
+            'Column': usage.index,
+            'Type': [str(df[col].dtype) for col in usage.index],
+            'Memory (KB)': (usage.values / 1024).round(1)
+        })
+        total = usage.sum()
+        report['Share'] = (usage.values / total * 100).round(1) if total else 0.0
+        return report.sort_values('Memory (KB)', ascending=False).reset_index(drop=True)
+
+    def _validate_columns(self, db_name, df):
+        """Validate that a table has the columns the tools rely on"""
+        expected_columns = BACKEND_TABLES[db_name]['required_columns']
+        missing_columns = [col for col in expected_columns if col not in df.columns]
+        if missing_columns:
+            return False, f"Missing columns: {', '.join(missing_columns)}. Found: {', '.join(map(str, df.columns))}"
+        return True, "Valid format"
+
+    def validate(self, db_name):
+        """Validate a table's format"""
+        df = self.load(db_name)
+        if df is None:
+            return False, self.get_status(db_name)
+        return self._validate_columns(db_name, df)
+
+# Global backend repository instance shared by every session
 @st.cache_resource
-def get_database_manager():
-    """Get cached database manager instance"""
-    return DatabaseManager()
+def get_backend_repository():
+    """Get cached backend repository instance"""
+    return BackendRepository()
 
 def display_enhanced_database_status():
     """Enhanced database status display"""
-    db_manager = get_database_manager()
-    databases, status = db_manager.load_all_databases()
-    
+    repository = get_backend_repository()
+    repository.load_all()
+
     st.markdown("### 🗄️ Backend Database Status")
-    
+
     # Create expandable sections for each database
-    for db_name, db_status in status.items():
-        with st.expander(f"{db_name.replace('_', ' ').title()}: {db_status}"):
-            df = databases.get(db_name)
+    for db_name in BACKEND_TABLES:
+        with st.expander(f"{db_name.replace('_', ' ').title()}: {repository.get_status(db_name)}"):
+            df = repository.load(db_name)
             if df is not None:
                 st.write(f"**Shape:** {df.shape[0]} rows × {df.shape[1]} columns")
                 st.write(f"**Columns:** {', '.join(df.columns)}")
@@ -139,5 +556,5 @@ def display_enhanced_database_status():
                     st.dataframe(df.head(3), use_container_width=True)
             else:
                 st.error("Database not loaded successfully")
-    
-    return databases, status
+
+    return repository
@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
 import re
 from pathlib import Path
+from utils.database_manager import get_backend_repository
+from utils.exclusion_registry import ExclusionColumns, load_exclusion_registry
 
 def parse_vcf_file(uploaded_file):
     """Parse VCF file and extract relevant information"""
@@ -420,25 +423,35 @@ def create_gene_regex(gene):
     """Create regex pattern for gene matching"""
     return rf'\b{re.escape(gene)}\b'
 
+# Exclusion patterns for each filter category
+EXCLUSION_PATTERNS = {
+    'Cancer/Oncology': r'\b(cancer|carcinoma|tumor|tumour|leukemia|leukaemia|lymphoma|oncol|malignant|neoplasm|metasta)\b',
+    'Trauma/Injury': r'\b(trauma|injury|wound|burn|fracture|accident|emergency)\b',
+    'Infectious Disease': r'\b(infection|bacterial|viral|sepsis|pneumonia|covid|influenza|hepatitis)\b',
+    'Cardiovascular': r'\b(cardiac|heart|cardio|coronary|stroke|myocardial|angina|arrhythmia)\b',
+    'Neurological': r'\b(alzheimer|parkinson|dementia|epilepsy|seizure|neurolog|brain|cognitive)\b',
+    'Psychiatric': r'\b(depression|anxiety|bipolar|schizophrenia|psychiatric|mental|mood)\b',
+    'Metabolic': r'\b(diabetes|diabetic|obesity|obese|metabolic|syndrome|glucose)\b',
+    'Autoimmune': r'\b(arthritis|lupus|inflammatory|bowel|disease|autoimmune|rheumat)\b'
+}
+
+def get_exclusion_registry():
+    """Get the site's own exclusion categories from the registry file"""
+    return load_exclusion_registry(reserved_names=tuple(EXCLUSION_PATTERNS))
+
+def get_exclusion_patterns():
+    """Get every exclusion category's regex - the built-in ones first, then the registry's"""
+    return {**EXCLUSION_PATTERNS, **get_exclusion_registry().patterns}
+
 def apply_exclusion_filters(trials_df, exclusion_filters):
     """Apply exclusion filters to trials dataframe"""
     if not exclusion_filters:
-        return pd.Series([True] * len(trials_df))
+        return pd.Series(True, index=trials_df.index)
     
-    # Define exclusion patterns for each category
-    exclusion_patterns = {
-        'Cancer/Oncology': r'\b(cancer|carcinoma|tumor|tumour|leukemia|leukaemia|lymphoma|oncol|malignant|neoplasm|metasta)\b',
-        'Trauma/Injury': r'\b(trauma|injury|wound|burn|fracture|accident|emergency)\b',
-        'Infectious Disease': r'\b(infection|bacterial|viral|sepsis|pneumonia|covid|influenza|hepatitis)\b',
-        'Cardiovascular': r'\b(cardiac|heart|cardio|coronary|stroke|myocardial|angina|arrhythmia)\b',
-        'Neurological': r'\b(alzheimer|parkinson|dementia|epilepsy|seizure|neurolog|brain|cognitive)\b',
-        'Psychiatric': r'\b(depression|anxiety|bipolar|schizophrenia|psychiatric|mental|mood)\b',
-        'Metabolic': r'\b(diabetes|diabetic|obesity|obese|metabolic|syndrome|glucose)\b',
-        'Autoimmune': r'\b(arthritis|lupus|inflammatory|bowel|disease|autoimmune|rheumat)\b'
-    }
+    exclusion_patterns = get_exclusion_patterns()
     
-    # Start with all trials included
-    mask = pd.Series([True] * len(trials_df))
+    # Start with all trials included - on the frame's own index so row subsets align
+    mask = pd.Series(True, index=trials_df.index)
     
     # Apply each selected filter
     for filter_name in exclusion_filters:
@@ -453,180 +466,69 @@ def apply_exclusion_filters(trials_df, exclusion_filters):
     
     return mask
 
-# Backend database loading functions
+def get_exclusion_bits(exclusion_filters, exclusion_patterns=None):
+    """Get the bitmask of the selected exclusion categories"""
+    categories = list(exclusion_patterns or get_exclusion_patterns())
+    bits = 0
+    for filter_name in exclusion_filters or []:
+        if filter_name in categories:
+            bits |= 1 << categories.index(filter_name)
+    return bits
 
-def load_backend_trial_database(check_only=False):
-    """Load backend clinical trials database"""
+def compute_exclusion_bitmask(trials_df, exclusion_patterns=None):
+    """Compute each trial's exclusion-category membership as one bit per category
+    
+    The result only depends on the trial database and the categories, so it
+    is computed once per database version; any filter combination is then a
+    bitwise AND.
+    """
+    return ExclusionColumns(trials_df).get_bitmask(exclusion_patterns or get_exclusion_patterns())
+
+def apply_exclusion_bitmask(bitmask, exclusion_filters, exclusion_patterns=None):
+    """Get the keep-mask for a trial bitmask under the selected exclusion filters"""
+    return (bitmask & get_exclusion_bits(exclusion_filters, exclusion_patterns)) == 0
+
+def count_exclusions(bitmask, exclusion_patterns=None):
+    """Count how many trials each exclusion category removes"""
+    return {
+        filter_name: int(np.count_nonzero(bitmask & (1 << bit)))
+        for bit, filter_name in enumerate(exclusion_patterns or get_exclusion_patterns())
+    }
+
+# Backend database loading functions - thin wrappers over the shared BackendRepository
+
+def _load_backend_database(db_name, label, check_only=False):
+    """Load a backend table through the shared repository"""
+    repository = get_backend_repository()
     try:
-        # Get from session state first
-        if 'databases' in st.session_state:
-            db = st.session_state['databases'].get('clinical_trials')
-            if db is not None:
-                if check_only:
-                    return len(db)
-                return db
-        
-        # Fallback to file loading with multiple encodings
-        base_path = Path(__file__).parent.parent
-        file_path = base_path / 'matched_clinical_trials_20240716_cleaned.csv'
-        
-        if file_path.exists():
-            # Try multiple encodings
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            
-            for encoding in encodings:
-                try:
-                    df = pd.read_csv(file_path, encoding=encoding)
-                    if check_only:
-                        return len(df)
-                    return df
-                except UnicodeDecodeError:
-                    continue
-            
-            # If no encoding worked
-            if check_only:
-                raise Exception("Could not decode file with any encoding")
-            st.error("Could not decode clinical trials file with any standard encoding")
-            return pd.DataFrame()
-        else:
-            if check_only:
-                return 0
+        if check_only:
+            return repository.check_available(db_name)
+        
+        df = repository.load(db_name)
+        if df is None:
+            if repository.get_file_path(db_name).exists():
+                st.error(f"Could not load {label} database: {repository.get_status(db_name)}")
             return pd.DataFrame()
+        return df
             
     except Exception as e:
         if check_only:
             raise e
-        st.error(f"Error loading clinical trials database: {str(e)}")
+        st.error(f"Error loading {label} database: {str(e)}")
         return pd.DataFrame()
 
+def load_backend_trial_database(check_only=False):
+    """Load backend clinical trials database"""
+    return _load_backend_database('clinical_trials', 'clinical trials', check_only)
+
 def load_backend_gene_disease_database(check_only=False):
     """Load backend gene-disease database"""
-    try:
-        # Get from session state first
-        if 'databases' in st.session_state:
-            db = st.session_state['databases'].get('gene_disease')
-            if db is not None:
-                if check_only:
-                    return len(db)
-                return db
-        
-        # Fallback to file loading with multiple encodings
-        base_path = Path(__file__).parent.parent
-        file_path = base_path / 'gene_disease.txt'
-        
-        if file_path.exists():
-            # Try multiple encodings
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            
-            for encoding in encodings:
-                try:
-                    df = pd.read_csv(file_path, sep='\t', encoding=encoding)
-                    if check_only:
-                        return len(df)
-                    return df
-                except UnicodeDecodeError:
-                    continue
-            
-            # If no encoding worked
-            if check_only:
-                raise Exception("Could not decode file with any encoding")
-            st.error("Could not decode gene-disease file with any standard encoding")
-            return pd.DataFrame()
-        else:
-            if check_only:
-                return 0
-            return pd.DataFrame()
-            
-    except Exception as e:
-        if check_only:
-            raise e
-        st.error(f"Error loading gene-disease database: {str(e)}")
-        return pd.DataFrame()
+    return _load_backend_database('gene_disease', 'gene-disease', check_only)
 
 def load_backend_orphan_drugs_database(check_only=False):
     """Load backend orphan drugs database"""
-    try:
-        # Get from session state first
-        if 'databases' in st.session_state:
-            db = st.session_state['databases'].get('orphan_drugs')
-            if db is not None:
-                if check_only:
-                    return len(db)
-                return db
-        
-        # Fallback to file loading with multiple encodings
-        base_path = Path(__file__).parent.parent
-        file_path = base_path / 'orphan_drugs.txt'
-        
-        if file_path.exists():
-            # Try multiple encodings
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            
-            for encoding in encodings:
-                try:
-                    df = pd.read_csv(file_path, sep='\t', encoding=encoding)
-                    if check_only:
-                        return len(df)
-                    return df
-                except UnicodeDecodeError:
-                    continue
-            
-            # If no encoding worked
-            if check_only:
-                raise Exception("Could not decode file with any encoding")
-            st.error("Could not decode orphan drugs file with any standard encoding")
-            return pd.DataFrame()
-        else:
-            if check_only:
-                return 0
-            return pd.DataFrame()
-            
-    except Exception as e:
-        if check_only:
-            raise e
-        st.error(f"Error loading orphan drugs database: {str(e)}")
-        return pd.DataFrame()
+    return _load_backend_database('orphan_drugs', 'orphan drugs', check_only)
 
 def load_backend_reactor_database(check_only=False):
     """Load backend REACTOR database"""
-    try:
-        # Get from session state first
-        if 'databases' in st.session_state:
-            db = st.session_state['databases'].get('rare_disease_matches')
-            if db is not None:
-                if check_only:
-                    return len(db)
-                return db
-        
-        # Fallback to file loading with multiple encodings
-        base_path = Path(__file__).parent.parent
-        file_path = base_path / 'rare_disease_matches_20240716_cleaned.csv'
-        
-        if file_path.exists():
-            # Try multiple encodings
-            encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
-            
-            for encoding in encodings:
-                try:
-                    df = pd.read_csv(file_path, encoding=encoding)
-                    if check_only:
-                        return len(df)
-                    return df
-                except UnicodeDecodeError:
-                    continue
-            
-            # If no encoding worked
-            if check_only:
-                raise Exception("Could not decode file with any encoding")
-            st.error("Could not decode REACTOR file with any standard encoding")
-            return pd.DataFrame()
-        else:
-            if check_only:
-                return 0
-            return pd.DataFrame()
-            
-    except Exception as e:
-        if check_only:
-            raise e
-        st.error(f"Error loading REACTOR database: {str(e)}")
-        return pd.DataFrame()
+    return _load_backend_database('rare_disease_matches', 'REACTOR', check_only)
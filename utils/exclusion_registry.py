@@ -0,0 +1,298 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+# Site-specific exclusion categories live beside the backend databases, as
+# {"categories": [{"name": ..., "terms": [...] or "pattern": regex, "description": ...}]}
+EXCLUSION_CONFIG_FILENAME = 'exclusion_categories.json'
+DEFAULT_CONFIG_PATH = Path(__file__).parent.parent / EXCLUSION_CONFIG_FILENAME
+
+MAX_PATTERN_LENGTH = 1000
+
+# Seconds a pattern may take over the probe texts before it is rejected
+PATTERN_TIME_BUDGET = 2.0
+
+# Inputs that expose catastrophic backtracking: a linear pattern runs through
+# them instantly, a nested quantifier takes exponential time on the failing tail
+PATTERN_PROBE_TEXTS = [
+    'a' * 40 + '!',
+    'a ' * 40 + '!',
+    'ab' * 40 + '!',
+    '1' * 40 + '!',
+    '-' * 40 + '!',
+    'A1 ' * 40 + '\n',
+    'A phase 2 study of a novel device in pediatric and adult patients with a rare disease. ' * 50
+]
+
+# Characters of a pattern's own literals that get a probe text of their own
+MAX_PROBE_LITERALS = 20
+
+_REPEAT_OPS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+# A pattern of the form \b(word|word)\b - what the SQLite engine can narrow by
+_WORD_LIST_RE = re.compile(r'\\b\(([^()\\]*)\)\\b')
+_WORD_RE = re.compile(r'[^\W_]+')
+
+_REGISTRY_CACHE = {}
+_PATTERN_CHECKS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+def build_terms_pattern(terms):
+    """Build a whole-word regex matching any of a list of terms"""
+    return r'\b(' + '|'.join(re.escape(term).replace(r'\ ', ' ') for term in terms) + r')\b'
+
+def get_pattern_words(pattern):
+    """Get the words of a \\b(word|word)\\b pattern, or None for any other regex"""
+    match = _WORD_LIST_RE.fullmatch(pattern)
+    if not match:
+        return None
+    words = match.group(1).split('|')
+    if not all(_WORD_RE.fullmatch(part) for word in words for part in word.split(' ')):
+        return None
+    return words
+
+def match_exclusion_pattern(trials_df, pattern):
+    """Get which trials' title or summary match an exclusion pattern, as a boolean array"""
+    return (
+        trials_df['StudyTitle'].str.contains(pattern, case=False, na=False) |
+        trials_df['BriefSummary'].str.contains(pattern, case=False, na=False)
+    ).to_numpy(dtype=bool)
+
+def get_patterns_fingerprint(exclusion_patterns):
+    """Hash an ordered set of exclusion categories, so structures built from them are keyed on their content"""
+    payload = json.dumps(list(exclusion_patterns.items()))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def _iter_subpatterns(av):
+    """Get the sub-patterns nested in one parsed regex node's arguments"""
+    for item in av if isinstance(av, (tuple, list)) else (av,):
+        if isinstance(item, sre_parse.SubPattern):
+            yield item
+        elif isinstance(item, (tuple, list)):
+            yield from _iter_subpatterns(item)
+
+def _has_unbounded_repeat(subpattern):
+    """Check whether a parsed regex holds a quantifier without an upper bound"""
+    for op, av in subpattern:
+        if op in _REPEAT_OPS and av[1] == sre_constants.MAXREPEAT:
+            return True
+        if any(_has_unbounded_repeat(child) for child in _iter_subpatterns(av)):
+            return True
+    return False
+
+def has_nested_quantifier(subpattern):
+    """Check whether a parsed regex repeats a group that holds an unbounded quantifier, like (a+)+"""
+    for op, av in subpattern:
+        children = list(_iter_subpatterns(av))
+        if op in _REPEAT_OPS and av[1] > 1 and any(_has_unbounded_repeat(child) for child in children):
+            return True
+        if any(has_nested_quantifier(child) for child in children):
+            return True
+    return False
+
+def _get_literal_chars(subpattern, chars):
+    """Collect the literal characters of a parsed regex, in order of appearance"""
+    for op, av in subpattern:
+        if op == sre_constants.LITERAL:
+            chars.setdefault(chr(av))
+        for child in _iter_subpatterns(av):
+            _get_literal_chars(child, chars)
+    return chars
+
+def get_probe_texts(parsed):
+    """Get the probe texts for a parsed pattern - the fixed ones plus a run of each of its literals"""
+    chars = list(_get_literal_chars(parsed, {}))[:MAX_PROBE_LITERALS]
+    return PATTERN_PROBE_TEXTS + [char * 40 + '!' for char in chars]
+
+def _run_pattern_probes(pattern, texts):
+    """Child process task: run a pattern over every probe text"""
+    compiled = re.compile(pattern, re.IGNORECASE)
+    for text in texts:
+        compiled.search(text)
+
+def _get_probe_context():
+    """Get the process context for pattern probes - fork where available, as it starts fastest"""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+def check_pattern(pattern, time_budget=PATTERN_TIME_BUDGET):
+    """Validate an exclusion pattern; returns an error message, or None if it is usable
+
+    Nested quantifiers, the usual cause of catastrophic backtracking, are
+    rejected outright. Python's regex engine cannot be interrupted, so the
+    pattern is then run over the probe texts in a child process that is
+    killed once it overruns the time budget. Results are remembered per
+    pattern.
+    """
+    if pattern in _PATTERN_CHECKS:
+        return _PATTERN_CHECKS[pattern]
+
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        error = f"pattern is longer than {MAX_PATTERN_LENGTH} characters"
+    else:
+        try:
+            parsed = sre_parse.parse(pattern, re.IGNORECASE)
+            re.compile(pattern, re.IGNORECASE)
+            error = None
+        except re.error as e:
+            error = f"invalid regex: {e}"
+        else:
+            if has_nested_quantifier(parsed):
+                error = "nested quantifier such as (a+)+ can backtrack catastrophically"
+
+    if error is None:
+        texts = get_probe_texts(parsed)
+        process = _get_probe_context().Process(target=_run_pattern_probes, args=(pattern, texts), daemon=True)
+        process.start()
+        process.join(time_budget)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+            error = f"pattern took over {time_budget:g}s on probe text (catastrophic backtracking?)"
+        elif process.exitcode != 0:
+            error = "pattern failed on probe text"
+
+    _PATTERN_CHECKS[pattern] = error
+    return error
+
+class ExclusionRegistry:
+    """The site's own exclusion categories, as loaded from the registry file
+
+    ``patterns`` maps each valid category to its regex, in file order;
+    ``descriptions`` holds the checkbox labels and ``errors`` a message for
+    every entry that was rejected.
+    """
+
+    def __init__(self, path, patterns=None, descriptions=None, errors=None):
+        self.path = Path(path)
+        self.patterns = patterns or {}
+        self.descriptions = descriptions or {}
+        self.errors = errors or []
+        self.fingerprint = get_patterns_fingerprint(self.patterns)
+
+def parse_exclusion_registry(path, config, reserved_names=()):
+    """Validate the categories of a registry file's parsed content"""
+    entries = config.get('categories') if isinstance(config, dict) else None
+    if not isinstance(entries, list):
+        return ExclusionRegistry(path, errors=["expected an object with a \"categories\" list"])
+
+    patterns, descriptions, errors = {}, {}, []
+    for number, entry in enumerate(entries, start=1):
+        name = entry.get('name') if isinstance(entry, dict) else None
+        if not isinstance(name, str) or not name.strip():
+            errors.append(f"Category {number}: missing \"name\"")
+            continue
+        name = name.strip()
+        if name in reserved_names or name in patterns:
+            errors.append(f"{name}: duplicate category name")
+            continue
+
+        terms = entry.get('terms')
+        pattern = entry.get('pattern')
+        if isinstance(terms, list) and terms and all(isinstance(term, str) and term.strip() for term in terms):
+            pattern = build_terms_pattern([term.strip() for term in terms])
+        elif not isinstance(pattern, str) or not pattern:
+            errors.append(f"{name}: needs a \"terms\" list or a \"pattern\" regex")
+            continue
+
+        error = check_pattern(pattern)
+        if error:
+            errors.append(f"{name}: {error}")
+            continue
+
+        patterns[name] = pattern
+        description = entry.get('description')
+        descriptions[name] = description if isinstance(description, str) and description else f"🏷️ {name}"
+
+    return ExclusionRegistry(path, patterns, descriptions, errors)
+
+def load_exclusion_registry(path=None, reserved_names=()):
+    """Load the exclusion category registry, re-reading the file only when it changes
+
+    A missing file is an empty registry. ``reserved_names`` are the
+    built-in categories, which a custom one may not replace.
+    """
+    path = Path(path) if path else DEFAULT_CONFIG_PATH
+    try:
+        stat = path.stat()
+    except OSError:
+        return ExclusionRegistry(path)
+
+    key = (str(path), stat.st_mtime_ns, stat.st_size, tuple(reserved_names))
+    registry = _REGISTRY_CACHE.get(str(path))
+    if registry is not None and registry[0] == key:
+        return registry[1]
+
+    with _REGISTRY_LOCK:
+        registry = _REGISTRY_CACHE.get(str(path))
+        if registry is not None and registry[0] == key:
+            return registry[1]
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            loaded = ExclusionRegistry(path, errors=[f"could not read {path.name}: {e}"])
+        else:
+            loaded = parse_exclusion_registry(path, config, reserved_names)
+
+        for error in loaded.errors:
+            logger.warning("Exclusion registry %s: %s", path, error)
+        _REGISTRY_CACHE[str(path)] = (key, loaded)
+        return loaded
+
+class ExclusionColumns:
+    """Per-trial exclusion-category membership of one trials table
+
+    Each category's match column is computed once, keyed by its regex, so
+    adding a category to the registry costs one pass over the trials for
+    that category alone. Columns are packed into one bitmask per ordered
+    category set - any filter combination is then a bitwise AND.
+    """
+
+    def __init__(self, trials_df):
+        self.trials_df = trials_df
+        self._columns = {}
+        self._bitmasks = {}
+        self._lock = threading.Lock()
+
+    def get_column(self, pattern):
+        """Get which trials match one exclusion pattern"""
+        column = self._columns.get(pattern)
+        if column is None:
+            with self._lock:
+                column = self._columns.get(pattern)
+                if column is None:
+                    column = match_exclusion_pattern(self.trials_df, pattern)
+                    self._columns[pattern] = column
+        return column
+
+    def get_bitmask(self, exclusion_patterns):
+        """Get one bit per category, in the categories' order, for every trial"""
+        fingerprint = get_patterns_fingerprint(exclusion_patterns)
+        bitmask = self._bitmasks.get(fingerprint)
+        if bitmask is not None:
+            return bitmask
+
+        dtype = np.min_scalar_type((1 << len(exclusion_patterns)) - 1)
+        bitmask = np.zeros(len(self.trials_df), dtype=dtype)
+        for bit, pattern in enumerate(exclusion_patterns.values()):
+            bitmask[self.get_column(pattern)] |= dtype.type(1 << bit)
+        bitmask.setflags(write=False)
+        self._bitmasks[fingerprint] = bitmask
+        return bitmask
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+
+# Distinct (gene, filter set) results kept across all sessions of the server
+DEFAULT_MAX_ENTRIES = 20000
+
+class GeneHitCache:
+    """Server-wide LRU cache of the trials matching a gene under a set of exclusion filters
+
+    Keys are (database version, engine, normalized gene, filter set), so a
+    result is only ever reused for the exact trial content it was computed
+    from. Seeing a new database version drops every entry of the old one.
+    Cached position arrays are read-only because every session shares them.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(version, engine, gene, exclusion_filters):
+        """Build the cache key for one gene lookup"""
+        return (version, engine, gene, frozenset(exclusion_filters or ()))
+
+    def bind_version(self, version):
+        """Note the current database version, dropping entries cached for any other"""
+        with self._lock:
+            if version == self._version:
+                return
+            if self._entries:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            self._version = version
+
+    def get(self, key):
+        """Get the cached trial positions for a key, or None on a miss"""
+        with self._lock:
+            positions = self._entries.get(key)
+            if positions is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return positions
+
+    def put(self, key, positions):
+        """Cache the trial positions for a key, evicting the least recently used entries"""
+        positions = positions.copy()
+        positions.setflags(write=False)
+        with self._lock:
+            # A result computed against an older version must not outlive it
+            if key[0] != self._version:
+                return
+            self._entries[key] = positions
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def get_stats(self):
+        """Get the cache counters for display"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'Entries': len(self._entries),
+                'Capacity': self.max_entries,
+                'Hits': self.hits,
+                'Misses': self.misses,
+                'Hit Rate': f"{self.hits / lookups:.1%}" if lookups else "-",
+                'Evictions': self.evictions,
+                'Invalidations': self.invalidations,
+                'Version': self._version or "-"
+            }
@@ -0,0 +1,209 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy import sparse
+except ImportError:
+    sparse = None
+
+logger = logging.getLogger(__name__)
+
+PHENOTYPE_INDEX_FORMAT = 1
+PHENOTYPE_INDEX_PREFIX = 'phenotype-tfidf-'
+
+# Persisted indexes kept, most recently used first - older trial text versions are deleted
+PHENOTYPE_KEEP_INDEXES = 3
+PHENOTYPE_TEXT_COLUMNS = ['StudyTitle', 'BriefSummary']
+
+# A term in the title says more about a trial than one in the summary
+TITLE_TERM_WEIGHT = 2.0
+
+# Patients scored per sparse product, bounding the size of the score matrix
+SCORE_BATCH_SIZE = 1024
+
+PHENOTYPE_TOKEN_PATTERN = r'[a-z0-9]{2,}'
+STOP_WORDS = frozenset("""
+    a an and are as at be been by for from has have in into is it its of on or that the their
+    this to was were which will with without study trial patients patient subjects participants
+""".split())
+
+def is_phenotype_matching_available():
+    """Check whether scipy is installed for phenotype similarity matching"""
+    return sparse is not None
+
+def tokenize_texts(texts):
+    """Split texts into lowercase terms, dropping stop words; returns a term Series indexed by text position"""
+    terms = pd.Series(texts).reset_index(drop=True).fillna('').astype(str).str.lower()
+    terms = terms.str.findall(PHENOTYPE_TOKEN_PATTERN).explode().dropna()
+    return terms[~terms.isin(STOP_WORDS)]
+
+def count_terms(terms, vocabulary, n_rows, weight=1.0):
+    """Count vocabulary terms per text as a sparse rows x vocabulary matrix"""
+    columns = vocabulary.get_indexer(terms.to_numpy())
+    known = columns >= 0
+    rows = terms.index.to_numpy(dtype=np.int64)[known]
+    matrix = sparse.csr_matrix(
+        (np.full(known.sum(), weight, dtype=np.float32), (rows, columns[known])),
+        shape=(n_rows, len(vocabulary))
+    )
+    matrix.sum_duplicates()
+    return matrix
+
+def weight_rows(counts, idf):
+    """Turn raw term counts into L2-normalized sublinear TF-IDF rows"""
+    weighted = counts.copy()
+    weighted.data = 1.0 + np.log(weighted.data)
+    weighted = weighted @ sparse.diags(idf.astype(np.float32))
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ weighted, dtype=np.float32)
+
+def get_text_fingerprint(trials_df):
+    """Hash the indexed trial text, so a persisted index is only reused for identical content"""
+    hashes = pd.util.hash_pandas_object(trials_df[PHENOTYPE_TEXT_COLUMNS].fillna(''), index=False)
+    return hashlib.sha256(hashes.to_numpy().tobytes()).hexdigest()[:16]
+
+class PhenotypeIndex:
+    """TF-IDF matrix over trial titles and summaries for phenotype similarity search
+
+    Built once per trial database version and persisted beside the
+    content-addressed table cache. Patients' phenotype texts are weighted
+    with the same vocabulary and IDF, and a whole cohort is scored against
+    every trial with batched sparse products (cosine similarity).
+    """
+
+    def __init__(self, trial_terms, vocabulary, idf):
+        self.trial_terms = trial_terms
+        self.vocabulary = vocabulary
+        self.idf = idf
+        # Term x trial layout for the patient x term @ term x trial product
+        self.term_trials = trial_terms.T.tocsr()
+
+    @classmethod
+    def build(cls, trials_df):
+        """Build the index from the trial titles and summaries"""
+        title_terms = tokenize_texts(trials_df['StudyTitle'])
+        summary_terms = tokenize_texts(trials_df['BriefSummary'])
+        vocabulary = pd.Index(pd.unique(pd.concat([title_terms, summary_terms]).to_numpy())).sort_values()
+
+        n_trials = len(trials_df)
+        counts = (
+            count_terms(title_terms, vocabulary, n_trials, TITLE_TERM_WEIGHT)
+            + count_terms(summary_terms, vocabulary, n_trials)
+        )
+        document_frequency = np.bincount(counts.indices, minlength=len(vocabulary))
+        idf = np.log((1.0 + n_trials) / (1.0 + document_frequency)) + 1.0
+        return cls(weight_rows(counts, idf), vocabulary, idf)
+
+    def save(self, path):
+        """Persist the index atomically as a NumPy archive"""
+        path = Path(path)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    data=self.trial_terms.data, indices=self.trial_terms.indices,
+                    indptr=self.trial_terms.indptr, shape=np.array(self.trial_terms.shape),
+                    vocabulary=np.array(self.vocabulary, dtype=str), idf=self.idf
+                )
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    @classmethod
+    def load(cls, path):
+        """Load a persisted index"""
+        with np.load(path, allow_pickle=False) as archive:
+            trial_terms = sparse.csr_matrix(
+                (archive['data'], archive['indices'], archive['indptr']), shape=tuple(archive['shape'])
+            )
+            return cls(trial_terms, pd.Index(archive['vocabulary'].astype(object)), archive['idf'])
+
+    def vectorize(self, texts):
+        """Weight phenotype texts with the trial vocabulary and IDF"""
+        texts = pd.Series(texts)
+        return weight_rows(count_terms(tokenize_texts(texts), self.vocabulary, len(texts)), self.idf)
+
+    def top_k(self, texts, k, trial_keep=None, batch_size=SCORE_BATCH_SIZE):
+        """Find each text's ``k`` most similar trials in batched sparse products
+
+        ``trial_keep`` is a boolean mask over trials; excluded trials are
+        zeroed as columns. Ties go to the earlier trial. Returns
+        ``(text_positions, trial_positions, scores)``, best first per text.
+        """
+        queries = self.vectorize(texts)
+        term_trials = self.term_trials
+        if trial_keep is not None:
+            term_trials = term_trials @ sparse.diags(trial_keep.astype(np.float32))
+
+        text_positions, trial_positions, scores = [], [], []
+        for start in range(0, queries.shape[0], batch_size):
+            batch = (queries[start:start + batch_size] @ term_trials).tocsr()
+            batch.eliminate_zeros()
+            for row in range(batch.shape[0]):
+                row_start, row_end = batch.indptr[row], batch.indptr[row + 1]
+                if row_start == row_end:
+                    continue
+                row_scores = batch.data[row_start:row_end]
+                row_trials = batch.indices[row_start:row_end]
+                if len(row_scores) > k:
+                    # Keep everything tied with the k-th best so the tie-break below sees it
+                    threshold = np.partition(row_scores, len(row_scores) - k)[len(row_scores) - k]
+                    best = row_scores >= threshold
+                    row_scores, row_trials = row_scores[best], row_trials[best]
+                order = np.lexsort((row_trials, -row_scores))[:k]
+                text_positions.append(np.full(len(order), start + row, dtype=np.int64))
+                trial_positions.append(row_trials[order].astype(np.int64))
+                scores.append(row_scores[order])
+
+        if not text_positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(text_positions), np.concatenate(trial_positions), np.concatenate(scores)
+
+def prune_phenotype_indexes(cache_dir, keep=PHENOTYPE_KEEP_INDEXES):
+    """Delete all but the ``keep`` most recently used persisted phenotype indexes"""
+    paths = []
+    for path in Path(cache_dir).glob(f"{PHENOTYPE_INDEX_PREFIX}*.npz"):
+        try:
+            paths.append((path.stat().st_mtime, path))
+        except OSError:
+            continue
+    for _, path in sorted(paths, reverse=True)[keep:]:
+        try:
+            path.unlink()
+        except OSError as e:
+            logger.warning("Could not prune phenotype index %s: %s", path, e)
+
+def load_phenotype_index(trials_df, cache_dir):
+    """Load the persisted phenotype index for this trial text, building and saving it if missing"""
+    path = Path(cache_dir) / f"{PHENOTYPE_INDEX_PREFIX}{get_text_fingerprint(trials_df)}-v{PHENOTYPE_INDEX_FORMAT}.npz"
+    if path.exists():
+        try:
+            index = PhenotypeIndex.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Rebuilding unreadable phenotype index %s: %s", path, e)
+        else:
+            try:
+                # Mark the index as recently used so pruning keeps it
+                path.touch()
+            except OSError:
+                pass
+            return index
+
+    index = PhenotypeIndex.build(trials_df)
+    try:
+        index.save(path)
+    except OSError as e:
+        # Persistence only saves the next cold start - a read-only directory must not block matching
+        logger.warning("Could not persist phenotype index: %s", e)
+        return index
+    prune_phenotype_indexes(cache_dir)
+    return index
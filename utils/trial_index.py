@@ -0,0 +1,174 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from utils.enhanced_data_utils import create_gene_regex
+
+# ASCII word runs. Every word run of a gene symbol must appear as a whole run of
+# this kind wherever \bGENE\b matches, so the postings of a gene's tokens always
+# cover its regex matches - under both Python re and Arrow's RE2 semantics
+TOKEN_PATTERN = r'[0-9A-Za-z_]+'
+_TOKEN_RE = re.compile(TOKEN_PATTERN)
+_ASCII_RE = re.compile(r'[\x00-\x7f]*')
+NON_ASCII_PATTERN = r'[^\x00-\x7f]'
+
+def get_gene_tokens(genes):
+    """Get the set of word tokens an index needs to look up the given genes"""
+    tokens = set()
+    for gene in genes:
+        tokens.update(_TOKEN_RE.findall(gene))
+    return tokens
+
+def scan_gene_positions(trials_df, gene, fields):
+    """Get the row positions whose fields match ``\\bGENE\\b`` by scanning every trial"""
+    gene_regex = create_gene_regex(gene)
+    mask = np.zeros(len(trials_df), dtype=bool)
+    for field in fields:
+        mask |= trials_df[field].str.contains(gene_regex, case=True, na=False).to_numpy(dtype=bool)
+    return np.flatnonzero(mask)
+
+def build_postings(texts, vocabulary=None):
+    """Map every token in a text column to the sorted row positions containing it
+
+    With a ``vocabulary`` only those tokens are kept, so a cohort's genes can
+    be matched in one pass over the text without indexing every word.
+    """
+    tokens = texts.reset_index(drop=True).str.findall(TOKEN_PATTERN).explode().dropna()
+    if vocabulary is not None:
+        tokens = tokens[tokens.isin(vocabulary)]
+    if tokens.empty:
+        return {}
+
+    codes, uniques = pd.factorize(tokens.to_numpy())
+    rows = tokens.index.to_numpy(dtype=np.int64)
+
+    # Sort by (token, row) and drop repeats of a token within a row
+    order = np.lexsort((rows, codes))
+    codes, rows = codes[order], rows[order]
+    keep = np.ones(len(codes), dtype=bool)
+    keep[1:] = (codes[1:] != codes[:-1]) | (rows[1:] != rows[:-1])
+    codes, rows = codes[keep], rows[keep]
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)]
+    return {uniques[codes[start]]: rows[start:end] for start, end in zip(starts, ends)}
+
+class TrialTokenIndex:
+    """Inverted index from word tokens to the trial rows and fields containing them
+
+    Built once per trial database version. A gene lookup intersects the
+    postings of the gene's tokens per field. A gene that is a single word is
+    matched exactly by its postings, except in text with non-ASCII letters
+    where Unicode word boundaries may differ; those rows, and every candidate
+    of a multi-word gene, are confirmed with the same case-sensitive
+    ``\\bGENE\\b`` regex a full scan uses, so results are identical to
+    scanning every trial.
+
+    With a ``vocabulary`` the index only covers those tokens: built from a
+    cohort's gene tokens it is a one-pass multi-gene scan of the trial text.
+    """
+
+    def __init__(self, trials_df, fields, vocabulary=None):
+        self.trials_df = trials_df
+        self.fields = list(fields)
+        self.vocabulary = vocabulary
+        self.postings = {field: build_postings(trials_df[field], vocabulary) for field in self.fields}
+        self.non_ascii = {
+            field: trials_df[field].str.contains(NON_ASCII_PATTERN, na=False).to_numpy(dtype=bool)
+            for field in self.fields
+        }
+
+    def can_lookup(self, gene):
+        """Check whether a gene's matches are covered by its token postings"""
+        if not _TOKEN_RE.search(gene) or _ASCII_RE.fullmatch(gene) is None:
+            return False
+        return self.vocabulary is None or get_gene_tokens([gene]) <= self.vocabulary
+
+    def _field_candidates(self, field, tokens):
+        """Get row positions whose field contains every one of the tokens"""
+        postings = self.postings[field]
+        lists = [postings.get(token) for token in tokens]
+        if any(rows is None for rows in lists):
+            return np.empty(0, dtype=np.int64)
+
+        candidates = min(lists, key=len)
+        for rows in lists:
+            if rows is not candidates:
+                candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        return candidates
+
+    def find_gene_positions(self, gene):
+        """Get the sorted row positions whose title or summary matches ``\\bGENE\\b``
+
+        Returns None when the gene has no ASCII word tokens to look up, in
+        which case the caller must fall back to a full scan.
+        """
+        if not self.can_lookup(gene):
+            return None
+
+        tokens = set(_TOKEN_RE.findall(gene))
+        single_word = _TOKEN_RE.fullmatch(gene) is not None
+        gene_regex = create_gene_regex(gene)
+        matched = []
+        for field in self.fields:
+            candidates = self._field_candidates(field, tokens)
+            if len(candidates) == 0:
+                continue
+
+            if single_word:
+                unsure = self.non_ascii[field][candidates]
+                if not unsure.any():
+                    matched.append(candidates)
+                    continue
+            else:
+                unsure = np.ones(len(candidates), dtype=bool)
+
+            texts = self.trials_df[field].iloc[candidates[unsure]]
+            confirmed = np.ones(len(candidates), dtype=bool)
+            confirmed[unsure] = texts.str.contains(gene_regex, case=True, na=False).to_numpy(dtype=bool)
+            matched.append(candidates[confirmed])
+
+        if not matched:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(matched))
+
+    def find_gene_hits(self, genes):
+        """Get the (Gene, TrialRow) hit table for a set of genes
+
+        Genes the index cannot look up are matched with a full regex scan, so
+        the table is always complete.
+        """
+        genes = list(dict.fromkeys(genes))
+        if not genes:
+            return pd.DataFrame({'Gene': pd.Series(dtype=object), 'TrialRow': pd.Series(dtype=np.int64)})
+
+        gene_positions = []
+        for gene in genes:
+            positions = self.find_gene_positions(gene)
+            if positions is None:
+                positions = scan_gene_positions(self.trials_df, gene, self.fields)
+            gene_positions.append(positions)
+        # One table for all genes rather than a frame per gene
+        return pd.DataFrame({
+            'Gene': np.repeat(np.array(genes, dtype=object), [len(positions) for positions in gene_positions]),
+            'TrialRow': np.concatenate(gene_positions).astype(np.int64)
+        })
+
+def scan_cohort_genes(trials_df, genes, fields):
+    """Match a whole cohort's genes in one pass over the trial text
+
+    Each text is tokenized once and only tokens of the cohort's genes are
+    kept, so the cost follows the total text size rather than the cohort
+    size. Returns the (Gene, TrialRow) hit table.
+    """
+    genes = list(dict.fromkeys(genes))
+    index = TrialTokenIndex(trials_df, fields, vocabulary=get_gene_tokens(genes))
+    return index.find_gene_hits(genes)
+
+def group_gene_hits(gene_hits):
+    """Turn a (Gene, TrialRow) hit table into a mapping of gene to sorted row positions"""
+    return {
+        gene: rows.to_numpy(dtype=np.int64)
+        for gene, rows in gene_hits.groupby('Gene', sort=False)['TrialRow']
+    }
@@ -0,0 +1,118 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+# Rows materialized at a time when a result is exported
+EXPORT_CHUNK_ROWS = 5000
+
+class TrialMatchResult:
+    """Trial matches held as (patient, trial) position pairs, materialized on demand
+
+    A match costs a few integers instead of a copy of the patient row and
+    the trial's full text. Rows are built only for the slice being shown or
+    exported: each trial in the slice is fetched once through
+    ``fetch_trial_rows`` and joined with Patient_/Trial_ column prefixes.
+    ``pair_columns`` holds extra per-match columns (such as a rank) and
+    ``index`` the row labels of the materialized frame.
+    """
+
+    def __init__(self, patient_df, patient_positions, trial_positions, fetch_trial_rows,
+                 pair_columns=None, index=None):
+        self.patient_df = patient_df
+        self.patient_positions = np.asarray(patient_positions, dtype=np.int64)
+        self.trial_positions = np.asarray(trial_positions, dtype=np.int64)
+        self.fetch_trial_rows = fetch_trial_rows
+        self.pair_columns = {name: np.asarray(values) for name, values in (pair_columns or {}).items()}
+        self.index = np.arange(len(self.patient_positions)) if index is None else np.asarray(index)
+
+    @classmethod
+    def concat(cls, results, patient_df, fetch_trial_rows):
+        """Combine results over the same patient table and trial source into one"""
+        results = list(results)
+        if not results:
+            return cls(patient_df, [], [], fetch_trial_rows)
+        return cls(
+            patient_df,
+            np.concatenate([result.patient_positions for result in results]),
+            np.concatenate([result.trial_positions for result in results]),
+            fetch_trial_rows,
+            {
+                name: np.concatenate([result.pair_columns[name] for result in results])
+                for name in results[0].pair_columns
+            },
+            np.concatenate([result.index for result in results])
+        )
+
+    def __len__(self):
+        return len(self.patient_positions)
+
+    def take(self, order):
+        """Get a result with the matches at the given positions, in that order"""
+        return TrialMatchResult(
+            self.patient_df,
+            self.patient_positions[order],
+            self.trial_positions[order],
+            self.fetch_trial_rows,
+            {name: values[order] for name, values in self.pair_columns.items()},
+            self.index[order]
+        )
+
+    def sort_index(self):
+        """Get a result ordered by its row labels"""
+        return self.take(np.argsort(self.index, kind='stable'))
+
+    @property
+    def nbytes(self):
+        """Memory held by the match arrays, excluding the shared source tables"""
+        arrays = [self.patient_positions, self.trial_positions, self.index, *self.pair_columns.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def count_unique_patients(self, id_column='PatientID'):
+        """Count the distinct patients with a match, by ``id_column`` or by patient row when None"""
+        if len(self) == 0:
+            return 0
+        if id_column not in self.patient_df.columns:
+            return len(np.unique(self.patient_positions))
+        return self.patient_df[id_column].take(np.unique(self.patient_positions)).nunique()
+
+    def count_unique_trials(self):
+        """Count the distinct trials matched by at least one patient"""
+        return len(np.unique(self.trial_positions))
+
+    def materialize(self, start=0, stop=None):
+        """Build the full match rows for a slice of the result"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return pd.DataFrame()
+
+        trial_positions = self.trial_positions[start:stop]
+        trial_ids = np.unique(trial_positions)
+        trials = self.fetch_trial_rows(trial_ids).reset_index(drop=True)
+        trial_rows = np.searchsorted(trial_ids, trial_positions)
+
+        patient_part = self.patient_df.iloc[self.patient_positions[start:stop]].add_prefix('Patient_')
+        trial_part = trials.iloc[trial_rows].add_prefix('Trial_')
+        matches = pd.concat(
+            [patient_part.reset_index(drop=True), trial_part.reset_index(drop=True)], axis=1
+        )
+        for name, values in self.pair_columns.items():
+            matches[name] = values[start:stop]
+        matches.index = self.index[start:stop]
+        return matches
+
+    def to_frame(self):
+        """Build every match row at once"""
+        return self.materialize()
+
+    def iter_frames(self, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Yield the match rows a slice at a time"""
+        for start in range(0, len(self), chunk_rows):
+            yield self.materialize(start, start + chunk_rows)
+
+    def to_csv(self, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Export the matches as CSV text, materializing one slice at a time"""
+        buffer = io.StringIO()
+        for number, frame in enumerate(self.iter_frames(chunk_rows)):
+            frame.to_csv(buffer, index=False, header=number == 0)
+        return buffer.getvalue()
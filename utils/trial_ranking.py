@@ -0,0 +1,112 @@
+import heapq
+import logging
+import math
+import re
+from bisect import bisect_right
+
+import numpy as np
+
+from utils.enhanced_data_utils import EXCLUSION_PATTERNS, create_gene_regex, get_exclusion_patterns
+from utils.exclusion_registry import get_patterns_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# A gene named in the title says more about a trial than one in the summary
+TITLE_WEIGHT = 3.0
+SUMMARY_WEIGHT = 1.0
+
+# An exclusion-category term within this many words of the gene suggests the
+# gene is only mentioned in a common-disease context
+PROXIMITY_WINDOW = 10
+PROXIMITY_PENALTY = 0.5
+
+_WORD_RE = re.compile(r'\w+')
+_EXCLUSION_RE_CACHE = {}
+
+def _compile_exclusion_regex(exclusion_patterns):
+    """Compile one case-insensitive regex matching a term of any of the given categories"""
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in exclusion_patterns.values()), re.IGNORECASE)
+
+def get_exclusion_regex():
+    """Get the regex over every exclusion category's terms, built-in and from the registry
+
+    Compiled once per category set, so ranking penalizes the same terms the
+    filters exclude on.
+    """
+    exclusion_patterns = get_exclusion_patterns()
+    fingerprint = get_patterns_fingerprint(exclusion_patterns)
+    exclusion_regex = _EXCLUSION_RE_CACHE.get(fingerprint)
+    if exclusion_regex is None:
+        try:
+            exclusion_regex = _compile_exclusion_regex(exclusion_patterns)
+        except re.error as e:
+            # Patterns valid alone can clash once joined (such as inline global flags)
+            logger.warning("Ranking with built-in exclusion categories only: %s", e)
+            exclusion_regex = _compile_exclusion_regex(EXCLUSION_PATTERNS)
+        _EXCLUSION_RE_CACHE.clear()
+        _EXCLUSION_RE_CACHE[fingerprint] = exclusion_regex
+    return exclusion_regex
+
+def _word_positions(text, spans):
+    """Map character offsets to word numbers within a text"""
+    word_starts = [match.start() for match in _WORD_RE.finditer(text)]
+    return [bisect_right(word_starts, start) - 1 for start, _ in spans]
+
+def _closest_distance(text, gene_spans, exclusion_regex):
+    """Get the word distance between the gene and the nearest exclusion-category term, or None"""
+    exclusion_spans = [match.span() for match in exclusion_regex.finditer(text)]
+    if not gene_spans or not exclusion_spans:
+        return None
+    gene_words = _word_positions(text, gene_spans)
+    exclusion_words = _word_positions(text, exclusion_spans)
+    return min(abs(g - e) for g in gene_words for e in exclusion_words)
+
+def score_trial(gene_pattern, title, summary, exclusion_regex=None):
+    """Score how relevant one trial is to a gene
+
+    Where the gene appears (title or summary) and how often set the base
+    score; an exclusion-category term close to the gene lowers it.
+    """
+    if exclusion_regex is None:
+        exclusion_regex = get_exclusion_regex()
+    title = title if isinstance(title, str) else ''
+    summary = summary if isinstance(summary, str) else ''
+    title_spans = [match.span() for match in gene_pattern.finditer(title)]
+    summary_spans = [match.span() for match in gene_pattern.finditer(summary)]
+
+    score = (
+        TITLE_WEIGHT * bool(title_spans)
+        + SUMMARY_WEIGHT * bool(summary_spans)
+        + math.log1p(len(title_spans) + len(summary_spans))
+    )
+
+    distances = [
+        distance for distance in (
+            _closest_distance(title, title_spans, exclusion_regex),
+            _closest_distance(summary, summary_spans, exclusion_regex)
+        ) if distance is not None
+    ]
+    if distances:
+        closeness = max(0.0, (PROXIMITY_WINDOW - min(distances)) / PROXIMITY_WINDOW)
+        score *= 1.0 - PROXIMITY_PENALTY * closeness
+    return round(score, 4)
+
+def rank_gene_hits(gene, positions, texts, top_k, page=1):
+    """Keep one page of a gene's best-scoring trials, best first
+
+    ``texts`` holds the StudyTitle and BriefSummary of the trials at
+    ``positions``, in the same order. A heap keeps only ``top_k * page``
+    candidates, so the cost stays bounded however common the gene is.
+    Ties go to the earlier trial. Returns ``(positions, scores)``.
+    """
+    gene_pattern = re.compile(create_gene_regex(gene))
+    exclusion_regex = get_exclusion_regex()
+    scored = (
+        (score_trial(gene_pattern, title, summary, exclusion_regex), -int(position))
+        for position, title, summary in zip(positions, texts['StudyTitle'], texts['BriefSummary'])
+    )
+    best = heapq.nlargest(top_k * page, scored)[top_k * (page - 1):]
+    return (
+        np.array([-position for _, position in best], dtype=np.int64),
+        np.array([score for score, _ in best], dtype=float)
+    )
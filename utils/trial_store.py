@@ -0,0 +1,300 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from utils.database_cache import (
+    STORE_SUFFIX, SUPPORTED_ENCODINGS, compute_file_hash, get_cache_dir, get_file_signature, get_table_info,
+    sniff_source_format
+)
+from utils.database_catalog import format_version
+from utils.enhanced_data_utils import create_gene_regex, get_exclusion_patterns
+from utils.exclusion_registry import get_pattern_words
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 50000
+SQLITE_MAX_PARAMS = 900
+TEXT_COLUMNS = ['StudyTitle', 'BriefSummary']
+
+# unicode61 splits on everything that is not a letter or number, so a gene
+# symbol's FTS phrase is built from the same runs
+FTS_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+def is_fts5_available():
+    """Check whether the local SQLite build includes the FTS5 extension"""
+    try:
+        with sqlite3.connect(':memory:') as conn:
+            conn.execute("CREATE VIRTUAL TABLE fts_probe USING fts5(content)")
+        return True
+    except sqlite3.Error:
+        return False
+
+def _quote_identifier(name):
+    """Quote a column name for use in SQL"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _to_sql_value(value):
+    """Convert a pandas cell into a value SQLite can store"""
+    if pd.isna(value):
+        return None
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+def build_fts_phrase(term):
+    """Build an FTS5 phrase query covering the letter/number runs of a term"""
+    tokens = FTS_TOKEN_PATTERN.findall(term)
+    if not tokens:
+        return None
+    return '"' + ' '.join(tokens) + '"'
+
+def build_exclusion_query(exclusion_filters):
+    """Build an FTS5 OR query over every word in the selected exclusion categories
+
+    Returns None when there is nothing to narrow by - no categories, or one
+    whose regex is not a plain word list.
+    """
+    exclusion_patterns = get_exclusion_patterns()
+    words = []
+    for filter_name in exclusion_filters or []:
+        pattern = exclusion_patterns.get(filter_name)
+        if pattern:
+            pattern_words = get_pattern_words(pattern)
+            if pattern_words is None:
+                return None
+            words.extend(pattern_words)
+    if not words:
+        return None
+    return ' OR '.join(f'"{word}"' for word in sorted(set(words)))
+
+class TrialStore:
+    """SQLite-backed clinical trials table with an FTS5 index on title and summary
+
+    The store is content-addressed like the columnar caches: each version of
+    the trials CSV is imported once into ``.trader_cache/<sha256>.sqlite``.
+    A store only ever opens the file of the version it was opened from, so
+    a hot reload never changes the rows behind row IDs a session already
+    holds. FTS5 narrows every lookup to candidate rows; the
+    candidates are then checked with the same regexes the pandas path uses,
+    so both engines return identical matches.
+    """
+
+    def __init__(self, source_path):
+        self.source_path = Path(source_path)
+        self.db_path = None
+        self._local = threading.local()
+        self._signature = None
+        self.source_sha256 = None
+        self.columns = []
+
+    def _connect(self):
+        """Get this thread's read-only connection to the store"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def reset_connections(self):
+        """Drop connections inherited from a parent process so a forked worker opens its own"""
+        self._local = threading.local()
+
+    def _read_meta(self, key, db_path=None):
+        """Read a value from a store's metadata table, or None"""
+        db_path = db_path or self.db_path
+        if db_path is None or not db_path.exists():
+            return None
+        try:
+            with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+                row = conn.execute("SELECT value FROM store_meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error:
+            return None
+
+    def get_store_path(self, source_hash):
+        """Get the content-addressed store file for a version of the trials CSV"""
+        return get_cache_dir(self.source_path) / f"{source_hash}{STORE_SUFFIX}"
+
+    @property
+    def version(self):
+        """Get the content version of the trials file the store was opened from"""
+        return format_version(self.source_sha256) if self.source_sha256 else None
+
+    def is_stale(self):
+        """Cheap check whether the source file changed since the store was opened"""
+        return self._signature != get_file_signature(self.source_path)
+
+    def open(self):
+        """Open the store, importing the CSV first if the store is missing or stale"""
+        self._signature = get_file_signature(self.source_path)
+        table_info = get_table_info(self.source_path)
+        source_hash = table_info['sha256'] if table_info else compute_file_hash(self.source_path)
+        db_path = self.get_store_path(source_hash)
+        # A finished import always has its metadata; anything else is rebuilt
+        if self._read_meta('source_sha256', db_path) != source_hash:
+            self.build(source_hash, table_info)
+        self.db_path = db_path
+        self.source_sha256 = source_hash
+
+        self.reset_connections()
+        cursor = self._connect().execute("SELECT * FROM trials LIMIT 0")
+        self.columns = [desc[0] for desc in cursor.description][1:]
+        return self
+
+    def build(self, source_hash, table_info=None):
+        """Stream the trials CSV into a fresh SQLite database and index it"""
+        if table_info is not None:
+            encoding, sep = table_info['encoding'], table_info['delimiter']
+        else:
+            encoding, sep = sniff_source_format(self.source_path, ',')
+
+        encodings = [encoding] + [enc for enc in SUPPORTED_ENCODINGS if enc != encoding]
+        db_path = self.get_store_path(source_hash)
+        db_path.parent.mkdir(exist_ok=True)
+        tmp_path = db_path.with_name(f"{db_path.name}.{os.getpid()}.tmp")
+
+        try:
+            for candidate in encodings:
+                try:
+                    self._import_csv(tmp_path, candidate, sep, source_hash)
+                    break
+                except UnicodeDecodeError:
+                    # The byte sample looked clean but a later part of the file did not
+                    continue
+            else:
+                raise ValueError("Could not decode clinical trials file with any standard encoding")
+
+            os.replace(tmp_path, db_path)
+        finally:
+            # A failed import must not leave a half-built database behind
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def _import_csv(self, tmp_path, encoding, sep, source_hash):
+        """Import the CSV in bounded chunks so the registry never has to fit in RAM"""
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            row_id = 0
+            insert_sql = None
+            for chunk in pd.read_csv(self.source_path, sep=sep, encoding=encoding, chunksize=IMPORT_CHUNK_SIZE):
+                if insert_sql is None:
+                    missing = [col for col in TEXT_COLUMNS if col not in chunk.columns]
+                    if missing:
+                        raise ValueError(f"Trial database missing columns: {', '.join(missing)}")
+
+                    column_sql = ', '.join(_quote_identifier(col) for col in chunk.columns)
+                    conn.execute(f"CREATE TABLE trials (row_id INTEGER PRIMARY KEY, {column_sql})")
+                    placeholders = ', '.join('?' * (len(chunk.columns) + 1))
+                    insert_sql = f"INSERT INTO trials VALUES ({placeholders})"
+
+                rows = []
+                for values in chunk.itertuples(index=False, name=None):
+                    rows.append((row_id,) + tuple(_to_sql_value(value) for value in values))
+                    row_id += 1
+                conn.executemany(insert_sql, rows)
+
+            if insert_sql is None:
+                raise ValueError("Clinical trials file is empty")
+
+            fts_columns = ', '.join(_quote_identifier(col) for col in TEXT_COLUMNS)
+            conn.execute(
+                f"CREATE VIRTUAL TABLE trials_fts USING fts5({fts_columns}, "
+                "content='trials', content_rowid='row_id', tokenize='unicode61 remove_diacritics 0')"
+            )
+            conn.execute("INSERT INTO trials_fts(trials_fts) VALUES('rebuild')")
+            conn.execute("CREATE TABLE store_meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.executemany("INSERT INTO store_meta VALUES (?, ?)", [
+                ('source_sha256', source_hash),
+                ('row_count', str(row_id))
+            ])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def row_count(self):
+        """Get the number of trials in the store"""
+        return int(self._read_meta('row_count') or 0)
+
+    def _scan_candidates(self, match_query, row_ids=None):
+        """Yield (row_id, title, summary) for rows the FTS index can match
+
+        With no query every row is scanned; ``row_ids`` restricts the scan
+        to the given rows.
+        """
+        title_col, summary_col = (_quote_identifier(col) for col in TEXT_COLUMNS)
+        if match_query is None:
+            sql = f"SELECT row_id, {title_col}, {summary_col} FROM trials WHERE 1"
+            params = []
+        else:
+            sql = (
+                f"SELECT t.row_id, t.{title_col}, t.{summary_col} FROM trials_fts "
+                "JOIN trials t ON t.row_id = trials_fts.rowid WHERE trials_fts MATCH ?"
+            )
+            params = [match_query]
+
+        if row_ids is None:
+            yield from self._connect().execute(f"{sql} ORDER BY row_id", params)
+            return
+
+        row_ids = sorted(int(row_id) for row_id in row_ids)
+        for start in range(0, len(row_ids), SQLITE_MAX_PARAMS):
+            batch = row_ids[start:start + SQLITE_MAX_PARAMS]
+            placeholders = ', '.join('?' * len(batch))
+            yield from self._connect().execute(
+                f"{sql} AND row_id IN ({placeholders}) ORDER BY row_id", params + batch
+            )
+
+    def find_excluded_ids(self, exclusion_filters, row_ids):
+        """Get which of the given row IDs the selected exclusion categories remove"""
+        exclusion_patterns = get_exclusion_patterns()
+        patterns = [
+            re.compile(exclusion_patterns[name], re.IGNORECASE)
+            for name in exclusion_filters or [] if name in exclusion_patterns
+        ]
+        if not patterns:
+            return set()
+
+        # A free-form regex has no words for FTS5 to narrow by, so its rows are checked directly
+        query = build_exclusion_query(exclusion_filters)
+        return {
+            row_id for row_id, title, summary in self._scan_candidates(query, row_ids)
+            if any(p.search(title or '') or p.search(summary or '') for p in patterns)
+        }
+
+    def find_gene_ids(self, gene, exclusion_filters=None):
+        """Get the sorted row IDs whose title or summary matches a gene, after exclusions"""
+        gene_pattern = re.compile(create_gene_regex(gene))
+        matched = [
+            row_id for row_id, title, summary in self._scan_candidates(build_fts_phrase(gene))
+            if gene_pattern.search(title or '') or gene_pattern.search(summary or '')
+        ]
+        if matched and exclusion_filters:
+            excluded = self.find_excluded_ids(exclusion_filters, matched)
+            matched = [row_id for row_id in matched if row_id not in excluded]
+        return matched
+
+    def fetch_rows(self, row_ids, columns=None):
+        """Fetch full trial rows for the given row IDs, in row ID order"""
+        columns = columns or self.columns
+        column_sql = ', '.join(_quote_identifier(col) for col in columns)
+        frames = []
+        # sqlite3 cannot bind NumPy integers, so IDs from array lookups are converted
+        row_ids = sorted(int(row_id) for row_id in row_ids)
+
+        for start in range(0, len(row_ids), SQLITE_MAX_PARAMS):
+            batch = row_ids[start:start + SQLITE_MAX_PARAMS]
+            placeholders = ', '.join('?' * len(batch))
+            sql = f"SELECT {column_sql} FROM trials WHERE row_id IN ({placeholders}) ORDER BY row_id"
+            frames.append(pd.DataFrame(self._connect().execute(sql, batch).fetchall(), columns=columns))
+
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)